@@ -1,26 +1,50 @@
-import requests
+import importlib
 import os
-import urllib.parse
+import threading
 from flask import Flask
 from flask_login import LoginManager
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from dotenv import load_dotenv
 
+from application import metrics
+from application.cache import TTLCache
+from application.database import configure_sqlite, database_uri, engine_options
+from application.executor import BoundedExecutor
+from application.fundamentals import FundamentalsCache
+from application.store import PriceStore
+from application.stream import PriceStream
+from application.universe import SymbolUniverse
+from application.providers import (CircuitBreaker, FakeProvider, IEXProvider,
+                                   YahooProvider)
+
 load_dotenv()
 
 
 # create app instance
 app = Flask(__name__)
 
-# create db instance
-db = SQLAlchemy(app)
 basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///stocks.db'
 
-if not os.path.exists(os.path.join(basedir, 'stocks.db')):
-    db.create_all()
-    db.session.commit()
+# database url, sqlite by default, postgresql://... for several workers
+app.config['SQLALCHEMY_DATABASE_URI'] = database_uri(os.getenv('DATABASE_URL', 'sqlite:///stocks.db'))
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# sqlite pragmas, busy timeout in ms and mmap size in bytes
+app.config['SQLITE_JOURNAL_MODE'] = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+app.config['SQLITE_SYNCHRONOUS'] = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+app.config['SQLITE_BUSY_TIMEOUT'] = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))
+app.config['SQLITE_MMAP_SIZE'] = int(os.getenv('SQLITE_MMAP_SIZE', 64 * 1024 * 1024))
+# connection pool per worker for server databases, timeouts in seconds
+app.config['DATABASE_POOL_SIZE'] = int(os.getenv('DATABASE_POOL_SIZE', 10))
+app.config['DATABASE_MAX_OVERFLOW'] = int(os.getenv('DATABASE_MAX_OVERFLOW', 5))
+app.config['DATABASE_POOL_TIMEOUT'] = float(os.getenv('DATABASE_POOL_TIMEOUT', 10))
+app.config['DATABASE_POOL_RECYCLE'] = int(os.getenv('DATABASE_POOL_RECYCLE', 1800))
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(
+    app.config['SQLALCHEMY_DATABASE_URI'], app.config)
+configure_sqlite(app.config)
+
+# create db instance
+db = SQLAlchemy(app)
 
 
 # create crypt library
@@ -35,30 +59,232 @@ login_manager.login_view = 'login'
 login_manager.login_message = 'Please, log in to access this page'
 login_manager.login_message_category = 'info'
 
+# request, sql and upstream metrics served at /metrics; with a token set
+# scrapers send it as "Authorization: Bearer <token>"
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+# seconds, requests slower than this leave a cProfile dump in
+# PROFILE_PATH, 0 disables profiling
+app.config['PROFILE_SLOW_REQUESTS'] = float(os.getenv('PROFILE_SLOW_REQUESTS', 0))
+app.config['PROFILE_PATH'] = os.getenv('PROFILE_PATH', os.path.join(basedir, 'data', 'profiles'))
+metrics.instrument(app)
+
 api_key = os.getenv('IEX_API_KEY')
 
+# upstream http settings: timeouts in seconds, retries per call,
+# consecutive failures before the circuit opens and seconds it stays open
+app.config['UPSTREAM_CONNECT_TIMEOUT'] = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', 3.05))
+app.config['UPSTREAM_READ_TIMEOUT'] = float(os.getenv('UPSTREAM_READ_TIMEOUT', 10))
+app.config['UPSTREAM_RETRIES'] = int(os.getenv('UPSTREAM_RETRIES', 2))
+app.config['UPSTREAM_BREAKER_FAILURES'] = int(os.getenv('UPSTREAM_BREAKER_FAILURES', 5))
+app.config['UPSTREAM_BREAKER_RESET'] = float(os.getenv('UPSTREAM_BREAKER_RESET', 30))
+# iex, yahoo or fake
+app.config['QUOTE_PROVIDER'] = os.getenv('QUOTE_PROVIDER', 'iex')
+
+# quote cache settings, seconds and number of symbols
+app.config['QUOTE_CACHE_TTL'] = float(os.getenv('QUOTE_CACHE_TTL', 15))
+app.config['QUOTE_CACHE_SIZE'] = int(os.getenv('QUOTE_CACHE_SIZE', 1024))
+
+
+def make_provider(name):
+    """Create quote provider configured from app settings."""
+    options = dict(
+        timeout=(app.config['UPSTREAM_CONNECT_TIMEOUT'],
+                 app.config['UPSTREAM_READ_TIMEOUT']),
+        retries=app.config['UPSTREAM_RETRIES'],
+        breaker=CircuitBreaker(app.config['UPSTREAM_BREAKER_FAILURES'],
+                               app.config['UPSTREAM_BREAKER_RESET']))
+    if name == 'iex':
+        # point IEX_BASE_URL at a local fake server for testing
+        return IEXProvider(api_key, os.getenv('IEX_BASE_URL',
+                           'https://cloud.iexapis.com/stable'), **options)
+    if name == 'yahoo':
+        return YahooProvider(**options)
+    if name == 'fake':
+        return FakeProvider(**options)
+    raise ValueError(f'Unknown quote provider: {name}')
+
+
+quote_provider = make_provider(app.config['QUOTE_PROVIDER'])
+# fundamentals and charts data always come from yahoo
+yahoo = (quote_provider if isinstance(quote_provider, YahooProvider)
+         else make_provider('yahoo'))
+
+quote_cache = TTLCache(ttl=app.config['QUOTE_CACHE_TTL'],
+                       maxsize=app.config['QUOTE_CACHE_SIZE'])
+
+# logged in users kept per process, seconds and number of users;
+# trades and profile changes drop the entry
+app.config['USER_CACHE_TTL'] = float(os.getenv('USER_CACHE_TTL', 60))
+app.config['USER_CACHE_SIZE'] = int(os.getenv('USER_CACHE_SIZE', 1024))
+
+user_cache = TTLCache(ttl=app.config['USER_CACHE_TTL'],
+                      maxsize=app.config['USER_CACHE_SIZE'])
+
+# okama namespaces served by /companies, snapshot directory and
+# refresh interval in seconds
+app.config['COMPANIES_NAMESPACES'] = os.getenv('COMPANIES_NAMESPACES', 'US').split(',')
+app.config['UNIVERSE_PATH'] = os.getenv('UNIVERSE_PATH', os.path.join(basedir, 'data'))
+app.config['UNIVERSE_REFRESH'] = float(os.getenv('UNIVERSE_REFRESH', 86400))
+
+universe = SymbolUniverse(app.config['UNIVERSE_PATH'],
+                          app.config['COMPANIES_NAMESPACES'],
+                          app.config['UNIVERSE_REFRESH'])
+
+# local price history, series older than PRICE_STORE_MAX_AGE seconds
+# are topped up from yahoo on read
+app.config['PRICE_STORE_PATH'] = os.getenv('PRICE_STORE_PATH', os.path.join(basedir, 'data', 'prices'))
+app.config['PRICE_STORE_MAX_AGE'] = float(os.getenv('PRICE_STORE_MAX_AGE', 12 * 3600))
+
+price_store = PriceStore(app.config['PRICE_STORE_PATH'], yahoo,
+                         app.config['PRICE_STORE_MAX_AGE'])
+
+# shared pool for upstream fan-out, seconds a page waits for upstream
+# before it renders with last known data
+app.config['EXECUTOR_WORKERS'] = int(os.getenv('EXECUTOR_WORKERS', 16))
+app.config['EXECUTOR_QUEUE'] = int(os.getenv('EXECUTOR_QUEUE', 256))
+app.config['UPSTREAM_DEADLINE'] = float(os.getenv('UPSTREAM_DEADLINE', 2))
+
+executor = BoundedExecutor(app.config['EXECUTOR_WORKERS'],
+                           app.config['EXECUTOR_QUEUE'])
+
+# yahoo company data kept on disk, ttl in seconds per dataset
+app.config['FUNDAMENTALS_PATH'] = os.getenv('FUNDAMENTALS_PATH', os.path.join(basedir, 'data', 'fundamentals'))
+app.config['FUNDAMENTALS_INFO_TTL'] = float(os.getenv('FUNDAMENTALS_INFO_TTL', 10 * 60))
+app.config['FUNDAMENTALS_FINANCIALS_TTL'] = float(os.getenv('FUNDAMENTALS_FINANCIALS_TTL', 3 * 86400))
+
+fundamentals = FundamentalsCache(app.config['FUNDAMENTALS_PATH'], yahoo, executor, {
+    'info': app.config['FUNDAMENTALS_INFO_TTL'],
+    'financials': app.config['FUNDAMENTALS_FINANCIALS_TTL'],
+    'quarterly_financials': app.config['FUNDAMENTALS_FINANCIALS_TTL']})
+
 
 def lookup(symbol):
-    """Look up quote for symbol."""
-    # Contact API
-    try:
-        url = f"https://cloud.iexapis.com/stable/stock/{urllib.parse.quote_plus(symbol)}/quote?token={api_key}"
-        response = requests.get(url)
-        response.raise_for_status()
-    except requests.RequestException:
-        return None
-
-    # Parse response
-    try:
-        quote = response.json()
-        return {
-            "name": quote["companyName"],
-            "price": float(quote["latestPrice"]),
-            "symbol": quote["symbol"],
-            "date": quote["latestUpdate"],
-            "change": quote["change"]
-        }
-    except (KeyError, TypeError, ValueError):
-        return None
-
-from application import views
\ No newline at end of file
+    """Look up quote for symbol, served from the shared quote cache."""
+    return quote_cache.get(symbol.strip().upper(), quote_provider.quote)
+
+
+def lookup_many(symbols, timeout=None):
+    """Look up quotes for several symbols, returns {symbol: quote or None}.
+
+    With a timeout, batches not loaded in time fall back to the last known
+    quote, copied with "stale": True.
+    """
+    keys = {symbol: symbol.strip().upper() for symbol in symbols}
+    if timeout is None:
+        quotes = quote_cache.get_many(keys.values(), quote_provider.quotes)
+        return {symbol: quotes.get(key) for symbol, key in keys.items()}
+
+    unique = list(dict.fromkeys(keys.values()))
+    size = quote_provider.batch_size
+    chunks = [tuple(unique[i:i + size]) for i in range(0, len(unique), size)]
+    done, late = executor.gather(
+        lambda chunk: quote_cache.get_many(chunk, quote_provider.quotes),
+        chunks, timeout)
+
+    quotes = {}
+    for loaded in done.values():
+        quotes.update(loaded)
+    for chunk in late:
+        for key in chunk:
+            last = quote_cache.peek(key)
+            quotes[key] = dict(last, stale=True) if last else None
+    return {symbol: quotes.get(key) for symbol, key in keys.items()}
+
+
+# request threads per worker process, set it to gunicorn's --threads
+app.config['REQUEST_THREADS'] = int(os.getenv('REQUEST_THREADS', 16))
+
+# live prices pushed over server-sent events: seconds between polls,
+# updates buffered per client, connected clients and symbols per client;
+# every stream holds a request thread, so streams never take all of them
+app.config['STREAM_INTERVAL'] = float(os.getenv('STREAM_INTERVAL', 5))
+app.config['STREAM_QUEUE_SIZE'] = int(os.getenv('STREAM_QUEUE_SIZE', 16))
+app.config['STREAM_MAX_CLIENTS'] = max(0, min(
+    int(os.getenv('STREAM_MAX_CLIENTS', app.config['REQUEST_THREADS'] // 2)),
+    app.config['REQUEST_THREADS'] - 1))
+app.config['STREAM_MAX_SYMBOLS'] = int(os.getenv('STREAM_MAX_SYMBOLS', 100))
+
+price_stream = PriceStream(
+    lambda symbols: lookup_many(symbols, timeout=app.config['UPSTREAM_DEADLINE']),
+    app.config['STREAM_INTERVAL'], app.config['STREAM_QUEUE_SIZE'],
+    app.config['STREAM_MAX_CLIENTS'])
+
+from application.prices import MarketPrices
+
+# shared price table for symbols any user holds or follows, seconds
+# between refreshes while the US market is open and closed, 0 disables
+app.config['PRICES_OPEN_INTERVAL'] = float(os.getenv('PRICES_OPEN_INTERVAL', 60))
+app.config['PRICES_CLOSED_INTERVAL'] = float(os.getenv('PRICES_CLOSED_INTERVAL', 1800))
+
+market_prices = MarketPrices(app, lookup_many, app.config['PRICES_OPEN_INTERVAL'],
+                             app.config['PRICES_CLOSED_INTERVAL'])
+
+from application import views
+from application.migrations import migrate
+from application.models import Sessions
+from application.sessions import ServerSessionInterface
+from application.valuation import ValuationSnapshotter
+
+# session data lives in the database, the cookie carries only its id;
+# expired sessions are deleted every SESSION_GC_INTERVAL seconds
+app.config['SESSION_GC_INTERVAL'] = float(os.getenv('SESSION_GC_INTERVAL', 3600))
+app.session_interface = ServerSessionInterface(db.engine, Sessions.__table__,
+                                               app.config['SESSION_GC_INTERVAL'])
+
+# seconds between portfolio valuation snapshots, 0 disables them
+app.config['VALUATION_SNAPSHOT_INTERVAL'] = float(os.getenv('VALUATION_SNAPSHOT_INTERVAL', 3600))
+snapshotter = ValuationSnapshotter(app, app.config['VALUATION_SNAPSHOT_INTERVAL'])
+
+# data libraries imported by create_app(preload=True), otherwise on
+# first use by /quote, /search, /companies and /performance
+PRELOAD_MODULES = ('pandas', 'yfinance', 'okama')
+
+_setup_lock = threading.Lock()
+_set_up = False
+_started_pid = None
+
+
+def create_app(preload=False):
+    """Prepare the database and data snapshots, return the app.
+
+    Importing the package only builds objects. Background jobs start on
+    the first request of each process, so the factory can run in a
+    gunicorn master started with --preload; preload=True then imports
+    the heavy data libraries once for all forked workers.
+    """
+    global _set_up
+    with _setup_lock:
+        if not _set_up:
+            # create tables added since the database file was made, then
+            # bring existing ones up to date
+            db.create_all()
+            migrate(db.engine)
+            universe.load()
+            with app.app_context():
+                market_prices.load()
+            # a gunicorn master must not hand pooled connections to the
+            # workers it forks, each worker opens its own
+            db.engine.dispose()
+            _set_up = True
+    if preload:
+        for name in PRELOAD_MODULES:
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                app.logger.warning('preload: %s is not installed', name)
+    return app
+
+
+@app.before_request
+def start_background():
+    """Set up on the first request and start background jobs per process."""
+    global _started_pid
+    if _started_pid == os.getpid():
+        return
+    create_app()
+    with _setup_lock:
+        if _started_pid != os.getpid():
+            universe.start()
+            market_prices.start()
+            snapshotter.start()
+            _started_pid = os.getpid()
@@ -0,0 +1,66 @@
+from datetime import datetime
+
+from dateutil.relativedelta import relativedelta
+
+from application import metrics, price_store
+from application.cache import TTLCache
+from application.providers import ProviderError
+
+# okama wealth indexes start from this amount
+INITIAL_AMOUNT = 1000
+
+# inflation the assets are compared to
+INFLATION = 'USD.INFL'
+
+# wealth indexes keyed by (sorted tickers, month), month in the key makes
+# entries roll over on their own, ttl only bounds how long they sit in memory
+wealth_cache = TTLCache(ttl=12 * 3600, maxsize=256)
+
+
+def _yahoo_symbol(asset):
+    # okama "AAPL.US" is "AAPL" on yahoo
+    return asset[:-3] if asset.endswith('.US') else asset
+
+
+def _load_wealth_indexes(key):
+    assets, first_date = key
+    symbols = {_yahoo_symbol(asset): asset for asset in assets}
+    try:
+        closes = price_store.frame(list(symbols) + [INFLATION], 'M')
+    except (ProviderError, KeyError, ValueError):
+        closes = None
+    if closes is None or closes.empty:
+        # symbol unknown to yahoo, let okama build the indexes
+        import okama as ok
+        with metrics.upstream('okama', 'AssetList'):
+            return ok.AssetList(list(assets), first_date=first_date).wealth_indexes
+    return rebase(closes.rename(columns=symbols), first_date)
+
+
+def rebase(df, first_date):
+    """Cut wealth indexes to start at first_date and rebase them."""
+    import pandas as pd
+    # okama puts the initial amount one month before first_date
+    start = pd.Period(first_date, freq='M') - 1
+    if start > df.index[0]:
+        df = df.loc[start:]
+    return df / df.iloc[0].to_numpy() * INITIAL_AMOUNT
+
+
+def wealth_indexes(assets, horizons=(13, 25, 61), now=None):
+    """Return {months: wealth indexes DataFrame} for each horizon.
+
+    History is fetched once for the longest horizon, shorter ones are
+    sliced out of it and rebased.
+    """
+    now = now or datetime.now()
+    first_dates = {months: (now + relativedelta(months=-months)).strftime("%Y-%m")
+                   for months in horizons}
+    key = (tuple(sorted(set(assets))), first_dates[max(horizons)])
+    full = wealth_cache.get(key, _load_wealth_indexes)
+
+    # keep the order the user typed the tickers in
+    columns = [c for c in assets if c in full.columns]
+    columns += [c for c in full.columns if c not in columns]
+    full = full[columns]
+    return {months: rebase(full, first_dates[months]) for months in horizons}
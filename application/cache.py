@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Call:
+    """In-flight upstream call shared by concurrent callers."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        # invalidated while loading, the value may predate the change
+        self.stale = False
+
+
+class TTLCache:
+    """Process-wide TTL + LRU cache with single-flight loading.
+
+    invalidate() also applies to loads in flight: their value is handed
+    to the callers already waiting but not stored, and later callers
+    start a new load.
+    """
+
+    def __init__(self, ttl=15, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _evict(self):
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def _fresh(self, key):
+        # must be called with the lock held
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        stored, value = entry
+        if time.monotonic() - stored > self.ttl:
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def _finish(self, key, call):
+        # must be called with the lock held
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def get(self, key, loader):
+        """Return cached value for key or load it once for all waiters."""
+        with self._lock:
+            entry = self._fresh(key)
+            if entry is not None:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            return call.value
+
+        try:
+            call.value = loader(key)
+        finally:
+            with self._lock:
+                self._finish(key, call)
+                # failed lookups are not cached, next caller retries
+                if call.value is not None and not call.stale:
+                    self._data[key] = (time.monotonic(), call.value)
+                    self._data.move_to_end(key)
+                    self._evict()
+            call.done.set()
+        return call.value
+
+    def get_many(self, keys, batch_loader):
+        """Return {key: value} loading all missing keys with one batch call."""
+        result = {}
+        waiting = {}
+        leading = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                entry = self._fresh(key)
+                if entry is not None:
+                    self.hits += 1
+                    result[key] = entry[1]
+                    continue
+                self.misses += 1
+                call = self._calls.get(key)
+                if call is None:
+                    leading[key] = self._calls[key] = _Call()
+                else:
+                    waiting[key] = call
+
+        if leading:
+            loaded = {}
+            try:
+                loaded = batch_loader(list(leading))
+            finally:
+                with self._lock:
+                    now = time.monotonic()
+                    for key, call in leading.items():
+                        self._finish(key, call)
+                        call.value = loaded.get(key)
+                        if call.value is not None and not call.stale:
+                            self._data[key] = (now, call.value)
+                            self._data.move_to_end(key)
+                    self._evict()
+                for call in leading.values():
+                    call.done.set()
+            for key, call in leading.items():
+                result[key] = call.value
+
+        for key, call in waiting.items():
+            call.done.wait()
+            result[key] = call.value
+        return result
+
+    def peek(self, key):
+        """Return last stored value for key even if expired, or None."""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry[1] if entry else None
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._data.clear()
+                calls, self._calls = self._calls, {}
+            else:
+                self._data.pop(key, None)
+                call = self._calls.pop(key, None)
+                calls = {key: call} if call else {}
+            for call in calls.values():
+                call.stale = True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,84 @@
+# Plotly chart specs built straight from pandas data. graph_objects
+# validate every property and PlotlyJSONEncoder walks the tree again,
+# these are plain dicts in the shape Plotly.react takes.
+import json
+import math
+
+from application.cache import TTLCache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# the parts of plotly's default template these charts rely on
+COLORWAY = ['#636efa', '#EF553B', '#00cc96', '#ab63fa', '#FFA15A',
+            '#19d3f3', '#FF6692', '#B6E880', '#FF97FF', '#FECB52']
+BASE_LAYOUT = {
+    'colorway': COLORWAY,
+    'paper_bgcolor': 'white',
+    'plot_bgcolor': '#E5ECF6',
+    'hovermode': 'closest',
+    'xaxis': {'gridcolor': 'white', 'linecolor': 'white', 'zerolinecolor': 'white',
+              'automargin': True},
+    'yaxis': {'gridcolor': 'white', 'linecolor': 'white', 'zerolinecolor': 'white',
+              'automargin': True},
+}
+
+# rendered charts keyed by caller supplied (name, period, data version)
+chart_cache = TTLCache(ttl=12 * 3600, maxsize=512)
+
+
+def dumps(spec):
+    if orjson is not None:
+        return orjson.dumps(spec).decode()
+    return json.dumps(spec, separators=(',', ':'))
+
+
+def _values(values):
+    # NaN is not valid JSON, plotly takes null as a gap
+    return [None if isinstance(v, float) and math.isnan(v) else v
+            for v in values.tolist()]
+
+
+def _layout(**layout):
+    spec = dict(BASE_LAYOUT, **layout)
+    for axis in ('xaxis', 'yaxis'):
+        spec[axis] = dict(BASE_LAYOUT[axis], **layout.get(axis, {}))
+    return spec
+
+
+def bar_chart(x, bars, title, yaxis_title):
+    """Grouped bar chart, bars is a list of (name, values, color)."""
+    data = [{'type': 'bar', 'name': name, 'x': list(x), 'y': _values(values),
+             'marker': {'color': color, 'line': {'width': 0.1}}}
+            for name, values, color in bars]
+    layout = _layout(
+        title={'text': title},
+        xaxis={'tickmode': 'array', 'tickvals': list(x), 'tickfont': {'size': 14}},
+        yaxis={'title': {'text': yaxis_title, 'font': {'size': 16}},
+               'tickfont': {'size': 14}},
+        legend={'x': 0, 'y': 1.0, 'bgcolor': 'rgba(255, 255, 255, 0)',
+                'bordercolor': 'rgba(255, 255, 255, 0)'},
+        barmode='group', bargap=0.15, bargroupgap=0.1)
+    return dumps({'data': data, 'layout': layout})
+
+
+def line_chart(df, title, yaxis_title, legend_title):
+    """Line per DataFrame column against the index."""
+    x = df.index.astype(str).tolist()
+    data = [{'type': 'scatter', 'mode': 'lines', 'name': str(column),
+             'legendgroup': str(column), 'x': x, 'y': _values(df[column].to_numpy()),
+             'hovertemplate': f'{legend_title}={column}<br>=%{{x}}<br>{yaxis_title}=%{{y}}<extra></extra>'}
+            for column in df.columns]
+    layout = _layout(
+        title={'text': title},
+        xaxis={'title': {'text': ''}},
+        yaxis={'title': {'text': yaxis_title}},
+        legend={'title': {'text': legend_title}})
+    return dumps({'data': data, 'layout': layout})
+
+
+def cached(key, build):
+    """Return chart for key, building it once per key."""
+    return chart_cache.get(key, lambda _: build())
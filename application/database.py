@@ -0,0 +1,52 @@
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# pragmas set on every new sqlite connection, filled by configure_sqlite
+SQLITE_PRAGMAS = {}
+
+
+def database_uri(url):
+    """Return SQLAlchemy URI for url, fixing the old postgres:// scheme."""
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def engine_options(uri, config):
+    """Return SQLALCHEMY_ENGINE_OPTIONS for the database behind uri."""
+    if uri.startswith('sqlite'):
+        # each thread gets its own connection, waiting on locks is done
+        # by busy_timeout
+        return {'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000}}
+    return {
+        'pool_size': config['DATABASE_POOL_SIZE'],
+        'max_overflow': config['DATABASE_MAX_OVERFLOW'],
+        'pool_timeout': config['DATABASE_POOL_TIMEOUT'],
+        'pool_recycle': config['DATABASE_POOL_RECYCLE'],
+        # drop connections the server closed instead of failing a request
+        'pool_pre_ping': True,
+    }
+
+
+def configure_sqlite(config):
+    """Set connect-time pragmas for sqlite from app config."""
+    SQLITE_PRAGMAS.update({
+        # readers don't block the writer and the other way round
+        'journal_mode': config['SQLITE_JOURNAL_MODE'],
+        # with WAL only a power loss can drop the last commits
+        'synchronous': config['SQLITE_SYNCHRONOUS'],
+        'busy_timeout': config['SQLITE_BUSY_TIMEOUT'],
+        'mmap_size': config['SQLITE_MMAP_SIZE'],
+    })
+
+
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+    cursor.close()
@@ -0,0 +1,89 @@
+import concurrent.futures as cf
+import threading
+import time
+
+from application import metrics
+
+
+class ExecutorFull(RuntimeError):
+    """Too many tasks waiting for a worker."""
+
+
+class BoundedExecutor:
+    """App-wide thread pool with a bounded queue and wait-time stats."""
+
+    def __init__(self, max_workers=16, max_queue=256):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = cf.ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='upstream')
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedule fn, raises ExecutorFull when the queue is at its limit."""
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise ExecutorFull(f'{self.queued} tasks waiting')
+            self.queued += 1
+        submitted = time.monotonic()
+
+        def run():
+            waited = time.monotonic() - submitted
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+            metrics.EXECUTOR_WAIT.observe(waited)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+
+        return self._pool.submit(run)
+
+    def gather(self, fn, items, timeout):
+        """Run fn for every item, wait up to timeout seconds.
+
+        Returns ({item: result} for calls done in time, [items still
+        pending or failed]). Late calls keep running and may still fill
+        caches for the next request.
+        """
+        futures = {}
+        failed = []
+        for item in items:
+            try:
+                futures[self.submit(fn, item)] = item
+            except ExecutorFull:
+                failed.append(item)
+        done, pending = cf.wait(futures, timeout=timeout)
+        results = {}
+        for future in done:
+            if future.exception() is None:
+                results[futures[future]] = future.result()
+            else:
+                failed.append(futures[future])
+        failed.extend(futures[future] for future in pending)
+        return results, failed
+
+    def stats(self):
+        with self._lock:
+            started = self.completed + self.running
+            return {
+                "workers": self.max_workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "wait_avg": self.wait_total / started if started else 0.0,
+                "wait_max": self.wait_max,
+            }
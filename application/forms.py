@@ -1,5 +1,3 @@
-import concurrent.futures as cf
-
 from flask import session
 from flask_login import current_user
 from flask_wtf import FlaskForm
@@ -7,10 +5,25 @@ from wtforms import (IntegerField, PasswordField, SelectField,
                      StringField, SubmitField)
 from wtforms.validators import DataRequired, EqualTo, Length, ValidationError
 
-from application import lookup
+from application import lookup, lookup_many, universe
+from application.universe import ticker_key
 from application.models import Holdings, Users
 
 
+def known_symbols(symbols):
+    """Return {symbol: bool} checked against the local symbol universe.
+
+    Upstream is asked only for symbols the universe can't answer, when
+    no snapshot has been loaded yet.
+    """
+    known = {symbol: universe.contains(symbol) for symbol in symbols}
+    unknown = [symbol for symbol, found in known.items() if found is None]
+    if unknown:
+        quotes = lookup_many(unknown)
+        known.update((symbol, quotes[symbol] is not None) for symbol in unknown)
+    return known
+
+
 class RegisterForm(FlaskForm):
     username = StringField(label='username', validators=[
                            Length(min=4, max=30), DataRequired()])
@@ -39,6 +52,10 @@ class QuoteForm(FlaskForm):
 
     def validate_symbol(self, field):
         symbol = field.data.replace('-', '.')
+        session['quote'] = None
+        if not known_symbols([symbol])[symbol]:
+            raise ValidationError("Invalid ticker.")
+        # the quote page needs the price, only fetched for a known symbol
         quote = lookup(symbol)
         session['quote'] = quote
         if not quote:
@@ -68,6 +85,8 @@ class BuyAsset(FlaskForm):
     submit = SubmitField(label='Buy')
 
     def validate_shares(self, field):
+        if self.symbol.errors:
+            return
         quote = lookup(self.symbol.data)
         if quote:
             max = current_user.cash // quote['price']
@@ -76,7 +95,7 @@ class BuyAsset(FlaskForm):
                     f"Number must be between 1 and {int(max)}.")
 
     def validate_symbol(self, field):
-        if lookup(field.data) == None:
+        if not known_symbols([field.data])[field.data]:
             raise ValidationError("Invalid ticker.")
 
 
@@ -96,8 +115,11 @@ class PasswordChangeForm(FlaskForm):
             raise ValidationError("This name is already taken")
 
     def validate_current_password(self, field):
-        user = Users.query.get(int(current_user.id))
-        if field.data and not user.correct_password(entered_password=field.data):
+        if not field.data:
+            return
+        # current_user may come from the user cache, check the stored hash
+        user = Users.query.populate_existing().get(current_user.id)
+        if not user.correct_password(entered_password=field.data):
             raise ValidationError("Invalid password")
 
     def validate_password(self, field):
@@ -118,14 +140,12 @@ class SearchForm(FlaskForm):
                        validators=[DataRequired()])
     submit = SubmitField('Search')
 
+    # okama tickers of the validated symbols, e.g. "BRK-B.US"
+    assets = None
+
     def validate_name(self, field):
-        submit = field.data.split(',')
-        symbols = []
-        for item in submit:
-            if len(item) > 1:
-                symbols.append(item.strip(" ").replace('-', '.'))
-        with cf.ThreadPoolExecutor() as executor:
-            responds = executor.map(lookup, symbols)
-            for item in responds:
-                if not item:
-                    raise ValidationError("Invalid ticker.")
+        symbols = [ticker_key(item) for item in field.data.split(',') if item.strip()]
+        if not symbols or not all(known_symbols(symbols).values()):
+            raise ValidationError("Invalid ticker.")
+        self.assets = [symbol.replace('.', '-') + '.US'
+                       for symbol in dict.fromkeys(symbols)]
@@ -0,0 +1,124 @@
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from application.executor import ExecutorFull
+
+DATASETS = ('info', 'financials', 'quarterly_financials')
+
+
+class FundamentalsCache:
+    """Memory and disk cache for yahoo company data.
+
+    Every dataset has its own ttl. Expired entries are still returned
+    while a background thread refreshes them (stale-while-revalidate),
+    so only a symbol seen for the first time waits on yahoo. Refreshes
+    run on the shared executor.
+    """
+
+    def __init__(self, path, provider, executor, ttls, maxsize=512):
+        self.path = path
+        self.provider = provider
+        self.executor = executor
+        self.ttls = ttls
+        self.maxsize = maxsize
+        self._memory = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _file(self, symbol, dataset):
+        return os.path.join(self.path, dataset, f'{symbol}.pkl')
+
+    def _read(self, symbol, dataset):
+        """Return (stored, data) from memory or disk, None if missing."""
+        key = (symbol, dataset)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+        try:
+            with open(self._file(symbol, dataset), 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+
+    def _write(self, symbol, data):
+        stored = time.time()
+        for dataset, value in data.items():
+            entry = (stored, value)
+            self._remember((symbol, dataset), entry)
+            path = self._file(symbol, dataset)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+
+    def _fetch(self, symbol, datasets):
+        data = self.provider.fundamentals(symbol, datasets)
+        self._write(symbol, data)
+        return data
+
+    def _revalidate(self, symbol, datasets):
+        with self._lock:
+            datasets = [d for d in datasets if (symbol, d) not in self._refreshing]
+            self._refreshing.update((symbol, d) for d in datasets)
+        if not datasets:
+            return
+
+        def run():
+            try:
+                self._fetch(symbol, datasets)
+            except Exception:
+                # keep serving stale data, next request tries again
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.difference_update((symbol, d) for d in datasets)
+
+        try:
+            self.executor.submit(run)
+        except ExecutorFull:
+            # too busy, stale data stays until a later request
+            with self._lock:
+                self._refreshing.difference_update((symbol, d) for d in datasets)
+
+    def stored(self, symbol, dataset):
+        """Return time the cached dataset was fetched, None if missing."""
+        entry = self._read(symbol.upper(), dataset)
+        return entry[0] if entry else None
+
+    def get(self, symbol, datasets=DATASETS):
+        """Return {dataset: data} for symbol."""
+        symbol = symbol.upper()
+        now = time.time()
+        result = {}
+        missing = []
+        stale = []
+        for dataset in datasets:
+            entry = self._read(symbol, dataset)
+            if entry is None:
+                missing.append(dataset)
+                continue
+            stored, result[dataset] = entry
+            if now - stored > self.ttls[dataset]:
+                stale.append(dataset)
+
+        if missing:
+            # refresh stale datasets in the same round trip
+            result.update(self._fetch(symbol, missing + stale))
+        elif stale:
+            self._revalidate(symbol, stale)
+        return result
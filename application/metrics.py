@@ -0,0 +1,202 @@
+import cProfile
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# seconds, prometheus client defaults
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+REGISTRY = []
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+
+
+class Counter:
+    """Monotonic counter per label values, rendered as name_total."""
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name}_total {self.help}',
+                 f'# TYPE {self.name}_total counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                labels = f'{{{_labels(self.labels, labels)}}}' if labels else ''
+                lines.append(f'{self.name}_total{labels} {value}')
+        return lines
+
+
+class Histogram:
+    """Cumulative buckets, sum and count per label values."""
+
+    def __init__(self, name, help, labels=(), buckets=TIME_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._values.items()):
+                prefix = _labels(self.labels, labels)
+                prefix = prefix + ',' if prefix else ''
+                for bound, value in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {value}')
+                lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+                labels = f'{{{prefix[:-1]}}}' if prefix else ''
+                lines.append(f'{self.name}_sum{labels} {total}')
+                lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+REQUEST_TIME = Histogram('http_request_duration_seconds', 'Request latency by route.',
+                         ('endpoint', 'method', 'status'))
+SQL_STATEMENTS = Histogram('sql_statements_per_request', 'SQL statements run by a request.',
+                           ('endpoint',), COUNT_BUCKETS)
+SQL_TIME = Histogram('sql_seconds_per_request', 'Time a request spent in SQL.',
+                     ('endpoint',))
+UPSTREAM_TIME = Histogram('upstream_call_duration_seconds',
+                          'Upstream call latency including retries.', ('provider', 'call'))
+UPSTREAM_ERRORS = Counter('upstream_errors', 'Failed upstream attempts.',
+                          ('provider', 'reason'))
+EXECUTOR_WAIT = Histogram('executor_wait_seconds',
+                          'Time tasks waited for a worker of the shared pool.')
+SLOW_PROFILES = Counter('slow_request_profiles', 'cProfile dumps of slow requests.',
+                        ('endpoint',))
+
+
+def render():
+    """Return all metrics in the Prometheus text format."""
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def upstream(provider, call):
+    """Time an upstream call, count it as an error if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.inc(provider, 'error')
+        raise
+    finally:
+        UPSTREAM_TIME.observe(time.perf_counter() - start, provider, call)
+
+
+def upstream_call(method):
+    """Decorate a provider method to record it under the provider name."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with upstream(self.name, method.__name__):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+# per request counters, set up by instrument() in the request thread
+_request = threading.local()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    if getattr(_request, 'active', False):
+        _request.sql_statements += 1
+        _request.sql_time += elapsed
+
+
+def instrument(app):
+    """Record request, SQL and slow request profiles for app.
+
+    PROFILE_SLOW_REQUESTS > 0 profiles every request and keeps a cProfile
+    dump in PROFILE_PATH for those slower than that many seconds.
+    """
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_request():
+        _request.active = True
+        _request.sql_statements = 0
+        _request.sql_time = 0.0
+        _request.profiler = None
+        if app.config['PROFILE_SLOW_REQUESTS'] > 0:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # another profiler is running in this process
+                profiler = None
+            _request.profiler = profiler
+        _request.start = time.perf_counter()
+
+    @app.after_request
+    def finish_request(response):
+        if not getattr(_request, 'active', False):
+            return response
+        elapsed = time.perf_counter() - _request.start
+        _request.active = False
+        endpoint = request.endpoint or 'unknown'
+        REQUEST_TIME.observe(elapsed, endpoint, request.method, response.status_code)
+        SQL_STATEMENTS.observe(_request.sql_statements, endpoint)
+        SQL_TIME.observe(_request.sql_time, endpoint)
+
+        profiler = _request.profiler
+        if profiler is not None:
+            profiler.disable()
+            _request.profiler = None
+            if elapsed > app.config['PROFILE_SLOW_REQUESTS']:
+                path = app.config['PROFILE_PATH']
+                os.makedirs(path, exist_ok=True)
+                name = f'{endpoint}-{int(time.time() * 1000)}-{int(elapsed * 1000)}ms.prof'
+                profiler.dump_stats(os.path.join(path, name))
+                SLOW_PROFILES.inc(endpoint)
+        return response
+
+    @app.teardown_request
+    def stop_profiler(exc):
+        # after_request is skipped when the view raised
+        profiler = getattr(_request, 'profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            _request.profiler = None
+        _request.active = False
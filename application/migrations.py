@@ -0,0 +1,153 @@
+from datetime import datetime
+
+import sqlalchemy as sa
+
+from application.models import History, Holdings
+
+
+def _version(conn):
+    conn.execute(sa.text(
+        'CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)'))
+    version = conn.execute(sa.text('SELECT version FROM schema_version')).scalar()
+    if version is None:
+        conn.execute(sa.text('INSERT INTO schema_version (version) VALUES (0)'))
+        return 0
+    return version
+
+
+def _rebuild(conn, table):
+    """Recreate a sqlite table from its model, keeping the rows."""
+    inspector = sa.inspect(conn)
+    old = {c['name'] for c in inspector.get_columns(table.name)}
+    columns = ', '.join(c.name for c in table.columns if c.name in old)
+    indexes = [index['name'] for index in inspector.get_indexes(table.name)]
+    conn.execute(sa.text(f'ALTER TABLE {table.name} RENAME TO {table.name}_old'))
+    for name in indexes:
+        # indexes move with the renamed table, free their names
+        conn.execute(sa.text(f'DROP INDEX {name}'))
+    table.create(conn)
+    conn.execute(sa.text(
+        f'INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {table.name}_old'))
+    conn.execute(sa.text(f'DROP TABLE {table.name}_old'))
+
+
+def _per_user_holdings(conn):
+    """Replace global unique symbol/company with unique (user_id, symbol)."""
+    inspector = sa.inspect(conn)
+    stale = [c for c in inspector.get_unique_constraints('holdings')
+             if c['column_names'] in (['symbol'], ['company'])]
+    if not stale:
+        return
+    if conn.dialect.name == 'sqlite':
+        # sqlite can't drop constraints, rebuild the table
+        _rebuild(conn, Holdings.__table__)
+    else:
+        for constraint in stale:
+            conn.execute(sa.text(
+                f'ALTER TABLE holdings DROP CONSTRAINT {constraint["name"]}'))
+        conn.execute(sa.text('ALTER TABLE holdings ADD CONSTRAINT '
+                             'uq_holdings_user_symbol UNIQUE (user_id, symbol)'))
+
+
+def _history_timestamp(conn):
+    """Add History.timestamp and fill it from the date strings."""
+    columns = [c['name'] for c in sa.inspect(conn).get_columns('history')]
+    if 'timestamp' not in columns:
+        conn.execute(sa.text('ALTER TABLE history ADD COLUMN timestamp INTEGER'))
+
+    rows = conn.execute(sa.text(
+        'SELECT id, date FROM history WHERE timestamp IS NULL')).fetchall()
+    updates = []
+    for id, date in rows:
+        try:
+            parsed = datetime.strptime(date, "%x, %X")
+        except ValueError:
+            # written under another locale, filled by _v3
+            continue
+        updates.append({'id': id, 'timestamp': int(parsed.timestamp())})
+    if updates:
+        conn.execute(sa.text(
+            'UPDATE history SET timestamp = :timestamp WHERE id = :id'), updates)
+
+
+def _indexes(conn):
+    """Create indexes declared on the models that the database lacks."""
+    for table in History.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _add_version(conn, table):
+    columns = [c['name'] for c in sa.inspect(conn).get_columns(table)]
+    if 'version' not in columns:
+        conn.execute(sa.text(
+            f'ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 1'))
+
+
+def _v1(conn):
+    _per_user_holdings(conn)
+    _history_timestamp(conn)
+    _indexes(conn)
+
+
+def _v2(conn):
+    # version counters for optimistic locking of cash and positions
+    _add_version(conn, 'users')
+    _add_version(conn, 'holdings')
+
+
+def _fill_timestamps(conn):
+    """Fill the timestamps _history_timestamp could not parse.
+
+    The date string is parsed leniently; failing that the row takes the
+    timestamp of the previous row by id, since rows are inserted in time
+    order, or of the next one for the oldest rows.
+    """
+    from dateutil import parser
+
+    rows = conn.execute(sa.text(
+        'SELECT id, date FROM history WHERE timestamp IS NULL')).fetchall()
+    updates = []
+    for id, date in rows:
+        try:
+            updates.append({'id': id, 'timestamp': int(parser.parse(date).timestamp())})
+        except (ValueError, OverflowError):
+            continue
+    if updates:
+        conn.execute(sa.text(
+            'UPDATE history SET timestamp = :timestamp WHERE id = :id'), updates)
+
+    for neighbour in ('SELECT timestamp FROM history h WHERE h.id < history.id '
+                      'AND h.timestamp IS NOT NULL ORDER BY h.id DESC LIMIT 1',
+                      'SELECT timestamp FROM history h WHERE h.id > history.id '
+                      'AND h.timestamp IS NOT NULL ORDER BY h.id LIMIT 1',
+                      'SELECT 0'):
+        conn.execute(sa.text(
+            f'UPDATE history SET timestamp = ({neighbour}) WHERE timestamp IS NULL'))
+
+
+def _v3(conn):
+    # every row gets a timestamp, then the column is required
+    _fill_timestamps(conn)
+    nullable = {c['name']: c['nullable'] for c in sa.inspect(conn).get_columns('history')}
+    if not nullable['timestamp']:
+        return
+    if conn.dialect.name == 'sqlite':
+        _rebuild(conn, History.__table__)
+    else:
+        conn.execute(sa.text('ALTER TABLE history ALTER COLUMN timestamp SET NOT NULL'))
+
+
+# (version, step), steps must cope with tables create_all just made
+MIGRATIONS = [(1, _v1), (2, _v2), (3, _v3)]
+
+
+def migrate(engine):
+    """Bring the database schema up to the latest version."""
+    with engine.begin() as conn:
+        version = _version(conn)
+        for number, step in MIGRATIONS:
+            if number > version:
+                step(conn)
+                conn.execute(sa.text('UPDATE schema_version SET version = :v'),
+                             {'v': number})
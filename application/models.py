@@ -1,11 +1,30 @@
 from flask_login import UserMixin
+from sqlalchemy.orm import make_transient_to_detached
 
-from application import bcrypt, db, login_manager
+from application import bcrypt, db, login_manager, user_cache
+
+
+def _user_row(user_id):
+    user = Users.query.get(user_id)
+    if user is None:
+        return None
+    # plain column values, shared between requests and threads
+    return {column.key: getattr(user, column.key)
+            for column in Users.__table__.columns}
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return Users.query.get(int(user_id))
+    """Return the user from the process cache, one query when it is cold."""
+    row = user_cache.get(int(user_id), _user_row)
+    if row is None:
+        return None
+    user = Users()
+    for key, value in row.items():
+        setattr(user, key, value)
+    # loaded and unchanged as far as the session is concerned
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
 
 
 class Users(db.Model, UserMixin):
@@ -13,9 +32,13 @@ class Users(db.Model, UserMixin):
     username = db.Column(db.String(length=30), nullable=False, unique=True)
     password_hash = db.Column(db.String(length=60), nullable=False)
     cash = db.Column(db.Integer(), nullable=False, default=10000)
+    # optimistic locking, updates check the version they read
+    version = db.Column(db.Integer(), nullable=False, server_default='1')
     portfolio = db.relationship('Holdings', backref='owner', lazy=True)
     operations = db.relationship('History', backref='trader', lazy=True)
 
+    __mapper_args__ = {'version_id_col': version}
+
     def __repr__(self):
         return f'User {self.username}, cash: {self.cash}'
 
@@ -33,10 +56,14 @@ class Users(db.Model, UserMixin):
 
 
 class Holdings(db.Model):
+    # one row per stock per user, also the index for per user lookups
+    __table_args__ = (db.UniqueConstraint('user_id', 'symbol',
+                                          name='uq_holdings_user_symbol'),)
+
     id = db.Column(db.Integer(), primary_key=True)
     shares = db.Column(db.Integer(), nullable=False, default=0)
-    company = db.Column(db.String(length=60), nullable=False, unique=True)
-    symbol = db.Column(db.String(length=10), nullable=False, unique=True)
+    company = db.Column(db.String(length=60), nullable=False)
+    symbol = db.Column(db.String(length=10), nullable=False)
     mean_price = db.Column(db.Float(
         precision=32, asdecimal=False, decimal_return_scale=None), nullable=False)
     price = db.Column(db.Float(precision=32, asdecimal=False,
@@ -45,6 +72,9 @@ class Holdings(db.Model):
                       decimal_return_scale=None))
     user_id = db.Column(db.Integer(), db.ForeignKey(
         'users.id'), nullable=False)
+    version = db.Column(db.Integer(), nullable=False, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
     def add_asset(self, user_obj, num_of_shares, comp, sym, mean):
         self.user_id = user_obj.id
@@ -53,10 +83,12 @@ class Holdings(db.Model):
         self.symbol = sym
         self.mean_price = mean
         db.session.add(self)
-        db.session.commit()
 
 
 class History(db.Model):
+    __table_args__ = (db.Index('ix_history_user_time', 'user_id', 'timestamp', 'id'),
+                      db.Index('ix_history_user_symbol', 'user_id', 'symbol'))
+
     id = db.Column(db.Integer(), primary_key=True)
     type = db.Column(db.String(10), nullable=False)
     company = db.Column(db.String(60), nullable=False)
@@ -65,6 +97,8 @@ class History(db.Model):
     price = db.Column(db.Float(precision=32, asdecimal=False,
                       decimal_return_scale=None), nullable=False)
     date = db.Column(db.String(15), nullable=False)
+    # unix time of the operation, the date string is for display only
+    timestamp = db.Column(db.Integer(), nullable=False)
     user_id = db.Column(db.Integer(), db.ForeignKey(
         'users.id'), nullable=False)
 
@@ -75,16 +109,16 @@ class History(db.Model):
         self.symbol = ticker
         self.shares = shares_num
         self.price = price
-        self.date = date
+        self.date = date.strftime("%x, %X")
+        self.timestamp = int(date.timestamp())
         db.session.add(self)
-        db.session.commit()
 
 
 class Lists(db.Model):
     id = db.Column(db.Integer(), primary_key=True)
     name = db.Column(db.String(15), nullable=False)
     user_id = db.Column(db.Integer(), db.ForeignKey(
-        'users.id'), nullable=False)
+        'users.id'), nullable=False, index=True)
     assets = db.relationship('Favourites', backref='lists', lazy=True)
 
     def __repr__(self):
@@ -98,6 +132,10 @@ class Lists(db.Model):
 
 
 class Favourites(db.Model):
+    __table_args__ = (db.Index('ix_favourites_user_list', 'user_id', 'list_id'),
+                      db.Index('ix_favourites_user_symbol', 'user_id', 'symbol'),
+                      db.Index('ix_favourites_list', 'list_id'))
+
     id = db.Column(db.Integer(), primary_key=True)
     company = db.Column(db.String(60), nullable=False)
     symbol = db.Column(db.String(10), nullable=False)
@@ -115,3 +153,46 @@ class Favourites(db.Model):
         self.company = company
         self.symbol = symbol
         db.session.add(self)
+
+
+class Valuations(db.Model):
+    id = db.Column(db.Integer(), primary_key=True)
+    date = db.Column(db.DateTime(), nullable=False, index=True)
+    cash = db.Column(db.Float(precision=32, asdecimal=False,
+                     decimal_return_scale=None), nullable=False)
+    holdings = db.Column(db.Float(precision=32, asdecimal=False,
+                         decimal_return_scale=None), nullable=False)
+    cost = db.Column(db.Float(precision=32, asdecimal=False,
+                     decimal_return_scale=None), nullable=False)
+    user_id = db.Column(db.Integer(), db.ForeignKey(
+        'users.id'), nullable=False, index=True)
+
+
+class NavSnapshots(db.Model):
+    __table_args__ = (db.UniqueConstraint('user_id', 'day'),)
+
+    id = db.Column(db.Integer(), primary_key=True)
+    day = db.Column(db.Date(), nullable=False)
+    nav = db.Column(db.Float(precision=32, asdecimal=False,
+                    decimal_return_scale=None), nullable=False)
+    cash = db.Column(db.Float(precision=32, asdecimal=False,
+                     decimal_return_scale=None), nullable=False)
+    user_id = db.Column(db.Integer(), db.ForeignKey(
+        'users.id'), nullable=False)
+
+
+class Sessions(db.Model):
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text(), nullable=False)
+    expiry = db.Column(db.DateTime(), nullable=False, index=True)
+
+
+class Prices(db.Model):
+    # last known quote per symbol held or followed by any user
+    symbol = db.Column(db.String(10), primary_key=True)
+    name = db.Column(db.String(60))
+    price = db.Column(db.Float(precision=32, asdecimal=False,
+                      decimal_return_scale=None), nullable=False)
+    change = db.Column(db.Float(precision=32, asdecimal=False,
+                       decimal_return_scale=None))
+    updated = db.Column(db.DateTime(), nullable=False)
@@ -0,0 +1,84 @@
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+
+from application import db, lookup_many, user_cache
+from application.models import History, Holdings, Users
+
+Order = namedtuple('Order', ['side', 'symbol', 'shares'])
+Fill = namedtuple('Fill', ['side', 'symbol', 'company', 'shares', 'price'])
+
+
+class OrderError(Exception):
+    """Order can not be executed, message is shown to the user."""
+
+
+def _apply(user_id, orders, quotes):
+    # the logged in user may come from the user cache, read fresh cash
+    user = Users.query.populate_existing().get(user_id)
+    date = datetime.now()
+    fills = []
+    for order in orders:
+        quote = quotes.get(order.symbol)
+        if not quote:
+            raise OrderError(f'Invalid ticker {order.symbol}.')
+        if order.shares < 1:
+            raise OrderError('Number of shares must be positive.')
+        symbol, price = quote["symbol"], quote["price"]
+        holding = Holdings.query.filter_by(user_id=user_id, symbol=symbol).first()
+        summ = price * order.shares
+
+        if order.side == 'buy':
+            if summ > user.cash:
+                raise OrderError(f'Not enough cash to buy {order.shares} share(s) of {symbol}.')
+            user.cash -= summ
+            if holding is None:
+                holding = Holdings()
+                holding.add_asset(user, order.shares, quote["name"], symbol, price)
+            else:
+                holding.mean_price = (
+                    holding.mean_price * holding.shares + summ) / (holding.shares + order.shares)
+                holding.shares += order.shares
+            operation = "Purchase"
+        elif order.side == 'sell':
+            if holding is None or holding.shares < order.shares:
+                raise OrderError(f'Not enough shares of {symbol} to sell.')
+            user.cash += summ
+            if holding.shares == order.shares:
+                db.session.delete(holding)
+            else:
+                holding.shares -= order.shares
+            operation = "Sell"
+        else:
+            raise OrderError(f'Unknown order side {order.side}.')
+
+        History().add_operation(user, operation, quote["name"], symbol,
+                                order.shares, price, date)
+        fills.append(Fill(order.side, symbol, quote["name"], order.shares, price))
+    return fills
+
+
+def execute_orders(user_id, orders, retries=3):
+    """Price, check and apply orders in one transaction, all or nothing.
+
+    Quotes for all orders come from one batched fetch. Users and Holdings
+    rows carry a version number, so a concurrent change to the same cash
+    or position makes the commit fail and the orders are applied again
+    on fresh rows.
+    """
+    quotes = lookup_many([order.symbol for order in orders])
+    for _ in range(retries):
+        try:
+            fills = _apply(user_id, orders, quotes)
+            db.session.commit()
+            user_cache.invalidate(user_id)
+            return fills
+        except (StaleDataError, IntegrityError):
+            # someone else changed the rows first, retry on fresh data
+            db.session.rollback()
+        except OrderError:
+            db.session.rollback()
+            raise
+    raise OrderError('Account was busy, please try again.')
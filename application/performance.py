@@ -0,0 +1,121 @@
+from datetime import date
+
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+
+from application import db, price_store
+from application.models import History, NavSnapshots, Users
+
+
+def _trade_days(timestamps):
+    """Return trade days as datetime64[D]."""
+    return np.array([date.fromtimestamp(timestamp) for timestamp in timestamps],
+                    dtype='datetime64[D]')
+
+
+def _ffill(values):
+    """Fill NaN in every column with the last value above it."""
+    mask = np.isnan(values)
+    idx = np.where(~mask, np.arange(len(values))[:, None], 0)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    return values[idx, np.arange(values.shape[1])]
+
+
+def replay(trades, cash_now, days):
+    """Return (nav, cash, real) arrays for days from the trade ledger.
+
+    trades is (days, symbol index, signed shares, price) arrays sorted by
+    day. Holdings are rebuilt on a trade-day x symbol matrix, daily values
+    pick the last trade day on or before each day. real is False for days
+    a held symbol was valued at a fallback instead of a current close.
+    """
+    trade_days, sym, shares, prices, symbols = trades
+    flows = -shares * prices
+
+    # aggregate trades per (day, symbol), then running totals per symbol
+    unique_days, day_idx = np.unique(trade_days, return_inverse=True)
+    delta = np.zeros((len(unique_days), len(symbols)))
+    np.add.at(delta, (day_idx, sym), shares)
+    positions = np.cumsum(delta, axis=0)
+
+    # last trade price per (day, symbol), used when there is no close
+    traded = np.full((len(unique_days), len(symbols)), np.nan)
+    traded[day_idx, sym] = prices
+    traded = _ffill(traded)
+
+    cash_flows = np.zeros(len(unique_days))
+    np.add.at(cash_flows, day_idx, flows)
+    # cash before the first trade follows from the current balance
+    cash = cash_now - flows.sum() + np.cumsum(cash_flows)
+
+    row = np.searchsorted(unique_days, days, side='right') - 1
+    before = row < 0
+    row[before] = 0
+
+    closes, real = price_store.matrix(symbols, days)
+    closes = np.where(np.isnan(closes), traded[row], closes)
+
+    held = positions[row]
+    held[before] = 0
+    cash_on_day = np.where(before, cash_now - flows.sum(), cash[row])
+    nav = cash_on_day + np.nansum(held * closes, axis=1)
+    return nav, cash_on_day, (real | (held == 0)).all(axis=1)
+
+
+def load_trades(user_id):
+    """Return trade arrays for replay, None when the user never traded."""
+    rows = db.session.query(History.type, History.symbol, History.shares,
+                            History.price, History.timestamp).\
+        filter_by(user_id=user_id).order_by(History.id).all()
+    if not rows:
+        return None
+    types, symbols, shares, prices, timestamps = zip(*rows)
+    names, sym = np.unique(np.array(symbols), return_inverse=True)
+    sign = np.where(np.array(types) == "Sell", -1, 1)
+    trade_days = _trade_days(timestamps)
+    order = np.argsort(trade_days, kind='stable')
+    return (trade_days[order], sym[order],
+            (sign * np.array(shares, dtype=float))[order],
+            np.array(prices, dtype=float)[order], list(names))
+
+
+def nav_history(user_id):
+    """Return (days, nav) for every day since the first trade.
+
+    Finished days are stored in nav_snapshots, so a request computes only
+    the days after the last snapshot plus today.
+    """
+    snapshots = NavSnapshots.query.filter_by(user_id=user_id).\
+        order_by(NavSnapshots.day).all()
+    days = [row.day for row in snapshots]
+    navs = [row.nav for row in snapshots]
+
+    trades = load_trades(user_id)
+    if trades is None:
+        return days, navs
+
+    today = np.datetime64(date.today(), 'D')
+    start = (np.datetime64(days[-1], 'D') + 1) if days else trades[0][0]
+    new_days = np.arange(start, today + 1, dtype='datetime64[D]')
+    if len(new_days) == 0:
+        return days, navs
+
+    cash_now = db.session.query(Users.cash).filter_by(id=user_id).scalar()
+    nav, cash, real = replay(trades, cash_now, new_days)
+
+    # today is not over yet, keep it out of the snapshots; stop at the
+    # first day valued with fallback prices, it is recomputed next time
+    finished = len(new_days) - 1
+    if not real[:finished].all():
+        finished = int(np.argmin(real[:finished]))
+    for day, value, balance in zip(new_days[:finished].tolist(), nav[:finished],
+                                   cash[:finished]):
+        db.session.add(NavSnapshots(user_id=user_id, day=day,
+                                    nav=float(value), cash=float(balance)))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # a concurrent request stored the same days first
+        db.session.rollback()
+
+    return days + new_days.tolist(), navs + nav.tolist()
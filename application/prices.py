@@ -0,0 +1,142 @@
+import threading
+import time
+from datetime import datetime, time as clock
+
+import pytz
+from sqlalchemy import bindparam
+
+from application import db
+from application.models import Favourites, Holdings, Prices
+
+EXCHANGE_TZ = pytz.timezone('America/New_York')
+MARKET_OPEN = clock(9, 30)
+MARKET_CLOSE = clock(16, 0)
+
+
+def market_open(now=None):
+    """True during regular US trading hours, holidays are not known."""
+    local = (now or datetime.now(pytz.utc)).astimezone(EXCHANGE_TZ)
+    return local.weekday() < 5 and MARKET_OPEN <= local.time() < MARKET_CLOSE
+
+
+class MarketPrices:
+    """Prices of every symbol held or followed by any user.
+
+    A background job refreshes the distinct symbols in one batched fetch
+    into the prices table, often while the market is open and rarely
+    while it is closed. Page handlers read an in-memory mirror of the
+    table; a quote older than two refresh intervals is marked stale.
+    With several workers, a worker that finds the table refreshed by
+    another one only reloads its mirror.
+    """
+
+    def __init__(self, app, fetch, open_interval=60, closed_interval=1800):
+        self.app = app
+        self.fetch = fetch
+        self.open_interval = open_interval
+        self.closed_interval = closed_interval
+        self._mirror = {}
+        self._thread = None
+        self.refreshes = 0
+
+    def interval(self):
+        return self.open_interval if market_open() else self.closed_interval
+
+    def symbols(self):
+        """Distinct symbols across all holdings and favourites."""
+        held = db.session.query(Holdings.symbol)
+        followed = db.session.query(Favourites.symbol)
+        return sorted(symbol for symbol, in held.union(followed))
+
+    def load(self):
+        """Fill the mirror from the prices table."""
+        self._mirror = {row.symbol: {'symbol': row.symbol, 'name': row.name,
+                                     'price': row.price, 'change': row.change,
+                                     'updated': row.updated}
+                        for row in Prices.query}
+
+    def refresh(self):
+        """Fetch quotes for all symbols and store them, returns their count."""
+        symbols = self.symbols()
+        if not symbols:
+            return 0
+        quotes = self.fetch(symbols)
+        now = datetime.utcnow()
+        rows = [{'symbol': symbol, 'name': quote['name'], 'price': quote['price'],
+                 'change': quote.get('change'), 'updated': now}
+                for symbol, quote in quotes.items() if quote]
+        if not rows:
+            return 0
+
+        table = Prices.__table__
+        stored = {symbol for symbol, in db.session.query(Prices.symbol).filter(
+            Prices.symbol.in_([row['symbol'] for row in rows]))}
+        updates = [dict(row, key=row['symbol']) for row in rows if row['symbol'] in stored]
+        inserts = [row for row in rows if row['symbol'] not in stored]
+        if updates:
+            db.session.execute(table.update().where(
+                table.c.symbol == bindparam('key')), updates)
+        if inserts:
+            db.session.execute(table.insert(), inserts)
+        db.session.commit()
+
+        mirror = dict(self._mirror)
+        mirror.update((row['symbol'], row) for row in rows)
+        self._mirror = mirror
+        self.refreshes += 1
+        return len(rows)
+
+    def get_many(self, symbols, timeout=None):
+        """Return {symbol: quote or None} from the mirror.
+
+        Symbols not in the table yet, e.g. bought since the last refresh,
+        are fetched with the given timeout.
+        """
+        if self._thread is None:
+            # refresher is off, the mirror would only get older
+            return self.fetch(symbols, timeout=timeout)
+        mirror = self._mirror
+        max_age = 2 * self.interval()
+        now = datetime.utcnow()
+        quotes = {}
+        missing = []
+        for symbol in symbols:
+            quote = mirror.get(symbol)
+            if quote is None:
+                missing.append(symbol)
+            elif (now - quote['updated']).total_seconds() > max_age:
+                quotes[symbol] = dict(quote, stale=True)
+            else:
+                quotes[symbol] = quote
+        if missing:
+            quotes.update(self.fetch(missing, timeout=timeout))
+        return quotes
+
+    def _tick(self):
+        latest = db.session.query(db.func.max(Prices.updated)).scalar()
+        if latest and (datetime.utcnow() - latest).total_seconds() < self.interval() / 2:
+            # another worker refreshed the table
+            self.load()
+        else:
+            self.refresh()
+
+    def start(self):
+        if self._thread is not None or self.open_interval <= 0:
+            return
+
+        def run():
+            while True:
+                with self.app.app_context():
+                    try:
+                        self._tick()
+                    except Exception:
+                        self.app.logger.exception('price refresh failed')
+                time.sleep(self.interval())
+
+        self._thread = threading.Thread(target=run, name='market-prices',
+                                        daemon=True)
+        self._thread.start()
+
+    def stats(self):
+        return {"symbols": len(self._mirror), "refreshes": self.refreshes,
+                "interval": self.interval(), "market_open": market_open()}
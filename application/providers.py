@@ -0,0 +1,343 @@
+import random
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from application import metrics
+
+
+class ProviderError(Exception):
+    """Upstream quote provider failed."""
+
+
+class CircuitOpenError(ProviderError):
+    """Upstream is marked as down, call was not attempted."""
+
+
+class _Transient(ProviderError):
+    """Upstream error worth retrying (5xx, 429)."""
+
+
+# errors that count against the circuit breaker and are retried
+TRANSIENT = (requests.ConnectionError, requests.Timeout, _Transient)
+
+
+class CircuitBreaker:
+    """Open after `failures` consecutive errors, probe again after `reset_after` s."""
+
+    def __init__(self, failures=5, reset_after=30):
+        self.failures = failures
+        self.reset_after = reset_after
+        self._count = 0
+        self._opened = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened is None:
+                return 'closed'
+            if time.monotonic() - self._opened >= self.reset_after:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        with self._lock:
+            if self._opened is None:
+                return True
+            if time.monotonic() - self._opened >= self.reset_after:
+                # let one probe through, push the window forward for others
+                self._opened = time.monotonic()
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self._count = 0
+            self._opened = None
+
+    def failure(self):
+        with self._lock:
+            self._count += 1
+            if self._count >= self.failures:
+                self._opened = time.monotonic()
+
+
+def make_session(pool_size=20):
+    """Keep-alive session with a connection pool shared by all threads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                          max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class Provider:
+    """Base class for quote providers.
+
+    Subclasses implement `_quote(symbol)` and optionally `_quotes(symbols)`,
+    returning quotes in the dict format used by `lookup()`.
+    """
+
+    name = 'base'
+    # symbols per upstream request in quotes()
+    batch_size = 1
+
+    def __init__(self, timeout=(3.05, 10), retries=2, backoff=0.2,
+                 breaker=None, session=None, pool_size=20):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.session = session or make_session(pool_size)
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn with bounded retries, jittered backoff and the breaker."""
+        if not self.breaker.allow():
+            metrics.UPSTREAM_ERRORS.inc(self.name, 'circuit_open')
+            raise CircuitOpenError(f'{self.name} is unavailable')
+        for attempt in range(self.retries + 1):
+            try:
+                result = fn(*args, **kwargs)
+            except TRANSIENT as e:
+                metrics.UPSTREAM_ERRORS.inc(self.name, 'transient')
+                self.breaker.failure()
+                if attempt == self.retries or not self.breaker.allow():
+                    raise ProviderError(f'{self.name}: {e}') from e
+                # full jitter exponential backoff
+                time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+            else:
+                self.breaker.success()
+                return result
+
+    def get(self, url, **kwargs):
+        response = self.session.get(url, timeout=self.timeout, **kwargs)
+        if response.status_code == 429 or response.status_code >= 500:
+            raise _Transient(f'HTTP {response.status_code}')
+        response.raise_for_status()
+        return response.json()
+
+    @metrics.upstream_call
+    def quote(self, symbol):
+        """Return quote for symbol or None."""
+        try:
+            return self.call(self._quote, symbol)
+        except (ProviderError, requests.RequestException, KeyError,
+                TypeError, ValueError):
+            return None
+
+    @metrics.upstream_call
+    def quotes(self, symbols):
+        """Return {symbol: quote or None} for symbols."""
+        try:
+            return self.call(self._quotes, symbols)
+        except (ProviderError, requests.RequestException, ValueError):
+            return {}
+
+    def fundamentals(self, symbol, datasets):
+        """Return {dataset: data} for info/financials/quarterly_financials."""
+        return {name: getattr(self, name)(symbol) for name in datasets}
+
+    def _quote(self, symbol):
+        raise NotImplementedError
+
+    def _quotes(self, symbols):
+        quotes = {}
+        for symbol in symbols:
+            try:
+                quotes[symbol] = self._quote(symbol)
+            except (requests.HTTPError, KeyError, TypeError, ValueError):
+                quotes[symbol] = None
+        return quotes
+
+
+class IEXProvider(Provider):
+    name = 'iex'
+
+    # IEX batch endpoint accepts up to 100 symbols per request
+    batch_size = 100
+
+    def __init__(self, api_key, base_url='https://cloud.iexapis.com/stable', **kwargs):
+        super().__init__(**kwargs)
+        self.api_key = api_key
+        self.base_url = base_url
+
+    def _quote(self, symbol):
+        data = self.get(
+            f"{self.base_url}/stock/{urllib.parse.quote_plus(symbol)}/quote",
+            params={"token": self.api_key})
+        return self.parse(data)
+
+    @metrics.upstream_call
+    def quotes(self, symbols):
+        # retry and breaker apply per chunk, one failed chunk keeps the rest
+        quotes = {}
+        for i in range(0, len(symbols), self.batch_size):
+            chunk = symbols[i:i + self.batch_size]
+            try:
+                quotes.update(self.call(self._batch, chunk))
+            except (ProviderError, requests.RequestException, ValueError):
+                continue
+        return quotes
+
+    def _batch(self, symbols):
+        data = self.get(f"{self.base_url}/stock/market/batch", params={
+            "symbols": ",".join(symbols), "types": "quote", "token": self.api_key})
+        # response is keyed by upper-cased symbol
+        quotes = {}
+        for symbol in symbols:
+            try:
+                quotes[symbol] = self.parse(data[symbol]["quote"])
+            except (KeyError, TypeError, ValueError):
+                quotes[symbol] = None
+        return quotes
+
+    @staticmethod
+    def parse(quote):
+        return {
+            "name": quote["companyName"],
+            "price": float(quote["latestPrice"]),
+            "symbol": quote["symbol"],
+            "date": quote["latestUpdate"],
+            "change": quote["change"]
+        }
+
+
+class YahooProvider(Provider):
+    """yfinance backed provider, also serves company fundamentals.
+
+    yfinance makes its own HTTP requests, so the (connect, read) timeout
+    is enforced as a deadline around each call run on a small pool. A
+    call past the deadline raises requests.Timeout and is left to finish
+    in the background.
+    """
+
+    name = 'yahoo'
+
+    def __init__(self, workers=8, **kwargs):
+        super().__init__(**kwargs)
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='yahoo')
+
+    @property
+    def deadline(self):
+        timeout = self.timeout
+        return sum(timeout) if isinstance(timeout, tuple) else timeout
+
+    def _run(self, fn):
+        future = self._pool.submit(fn)
+        try:
+            return future.result(timeout=self.deadline)
+        except FutureTimeout:
+            future.cancel()
+            raise requests.Timeout(f'no answer within {self.deadline:g}s') from None
+
+    def ticker(self, symbol):
+        import yfinance as yf
+        return yf.Ticker(symbol)
+
+    @metrics.upstream_call
+    def info(self, symbol):
+        return self.call(self._run, lambda: self.ticker(symbol).info)
+
+    @metrics.upstream_call
+    def financials(self, symbol):
+        return self.call(self._run, lambda: self.ticker(symbol).financials)
+
+    @metrics.upstream_call
+    def quarterly_financials(self, symbol):
+        return self.call(self._run, lambda: self.ticker(symbol).quarterly_financials)
+
+    @metrics.upstream_call
+    def fundamentals(self, symbol, datasets):
+        # one Ticker for all datasets, yfinance shares the downloads
+        def fetch():
+            ticker = self.ticker(symbol)
+            return {name: getattr(ticker, name) for name in datasets}
+        return self.call(self._run, fetch)
+
+    @metrics.upstream_call
+    def history(self, symbol, start=None, interval='1d'):
+        """Return DataFrame with a Close column, full history if no start."""
+        period = {'period': 'max'} if start is None else {'start': start}
+        return self.call(self._run, lambda: self.ticker(symbol).history(
+            interval=interval, timeout=self.deadline, **period))
+
+    def _quote(self, symbol):
+        info = self._run(lambda: self.ticker(symbol).info)
+        price = float(info["regularMarketPrice"])
+        return {
+            "name": info["longName"],
+            "price": price,
+            "symbol": info["symbol"],
+            "date": int(info["regularMarketTime"]) * 1000,
+            "change": price - info["previousClose"]
+        }
+
+
+class FakeProvider(Provider):
+    """In-process provider for tests and benchmarks.
+
+    `data` maps symbol to a quote dict, `latency` is seconds per call and
+    `failure_rate` the share of calls that fail as a transient error.
+    """
+
+    name = 'fake'
+    batch_size = 100
+
+    def __init__(self, data=None, latency=0, failure_rate=0, info=None, **kwargs):
+        kwargs.setdefault('backoff', 0)
+        super().__init__(**kwargs)
+        self.data = data if data is not None else {}
+        self.info_data = info if info is not None else {}
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+
+    def _upstream(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise _Transient('fake failure')
+
+    def _quote(self, symbol):
+        self._upstream()
+        return self.data.get(symbol)
+
+    def _quotes(self, symbols):
+        self._upstream()
+        return {symbol: self.data.get(symbol) for symbol in symbols}
+
+    @metrics.upstream_call
+    def info(self, symbol):
+        def fetch():
+            self._upstream()
+            return self.info_data[symbol]['info']
+        return self.call(fetch)
+
+    @metrics.upstream_call
+    def financials(self, symbol):
+        def fetch():
+            self._upstream()
+            return self.info_data[symbol]['financials']
+        return self.call(fetch)
+
+    @metrics.upstream_call
+    def quarterly_financials(self, symbol):
+        def fetch():
+            self._upstream()
+            return self.info_data[symbol]['quarterly_financials']
+        return self.call(fetch)
+
+    @metrics.upstream_call
+    def history(self, symbol, start=None, interval='1d'):
+        def fetch():
+            self._upstream()
+            df = self.info_data[symbol]['history'][interval]
+            return df if start is None else df.loc[start:]
+        return self.call(fetch)
@@ -0,0 +1,119 @@
+import secrets
+import threading
+import time
+from datetime import datetime
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session data kept in the database, the cookie holds only `sid`."""
+
+    def __init__(self, initial=None, sid=None, new=False, expiry=None):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expiry = expiry
+        self.modified = False
+        # sid replaced by regenerate(), its row is deleted on save
+        self.previous = None
+
+    def regenerate(self):
+        """Move the data to a new sid, e.g. on login and logout."""
+        if not self.new and self.previous is None:
+            self.previous = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.new = True
+        self.modified = True
+
+
+class ServerSessionInterface(SessionInterface):
+    """Store sessions in `table` (id, data, expiry) through `engine`.
+
+    Requests for static files get an empty session without a database
+    round trip. Rows are written only when the session changed or half of
+    its lifetime has passed. Expired rows are deleted at most once every
+    `gc_interval` seconds by the request that saves a session.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, engine, table, gc_interval=3600):
+        self.engine = engine
+        self.table = table
+        self.gc_interval = gc_interval
+        self._last_gc = time.monotonic()
+        self._lock = threading.Lock()
+
+    def open_session(self, app, request):
+        if app.static_url_path and request.path.startswith(app.static_url_path + '/'):
+            # static files never read the session, skip the database;
+            # an empty new session is not saved and leaves the cookie alone
+            return ServerSession(new=True)
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            t = self.table
+            with self.engine.connect() as conn:
+                row = conn.execute(t.select().where(
+                    t.c.id == sid, t.c.expiry > datetime.utcnow())).first()
+            if row is not None:
+                return ServerSession(self.serializer.loads(row.data), sid,
+                                     expiry=row.expiry)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        t = self.table
+
+        if session.previous is not None:
+            with self.engine.begin() as conn:
+                conn.execute(t.delete().where(t.c.id == session.previous))
+
+        if not session:
+            if not session.new:
+                with self.engine.begin() as conn:
+                    conn.execute(t.delete().where(t.c.id == session.sid))
+            if not session.new or session.previous is not None:
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        lifetime = app.permanent_session_lifetime
+        now = datetime.utcnow()
+        stale = session.expiry is None or session.expiry - now < lifetime / 2
+        if not (session.new or session.modified or stale):
+            return
+
+        values = {'data': self.serializer.dumps(dict(session)),
+                  'expiry': now + lifetime}
+        with self.engine.begin() as conn:
+            updated = 0
+            if not session.new:
+                updated = conn.execute(t.update().where(
+                    t.c.id == session.sid).values(**values)).rowcount
+            if not updated:
+                conn.execute(t.insert().values(id=session.sid, **values))
+        self.collect(now)
+
+        response.set_cookie(name, session.sid,
+                            expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app),
+                            domain=domain, path=path,
+                            secure=self.get_cookie_secure(app),
+                            samesite=self.get_cookie_samesite(app))
+
+    def collect(self, now=None):
+        """Delete expired sessions if gc_interval passed since the last run."""
+        with self._lock:
+            if time.monotonic() - self._last_gc < self.gc_interval:
+                return
+            self._last_gc = time.monotonic()
+        t = self.table
+        with self.engine.begin() as conn:
+            conn.execute(t.delete().where(t.c.expiry <= (now or datetime.utcnow())))
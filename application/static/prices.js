@@ -0,0 +1,32 @@
+// Live prices for elements marked with data-price / data-change="SYMBOL"
+$(document).ready(function() {
+  var symbols = [];
+  $("[data-price], [data-change]").each(function() {
+    var symbol = $(this).attr("data-price") || $(this).attr("data-change");
+    if (symbols.indexOf(symbol) < 0) {
+      symbols.push(symbol);
+    }
+  });
+  if (symbols.length < 1 || !window.EventSource) {
+    return;
+  }
+
+  function format(value) {
+    return value.toLocaleString("en-US", {minimumFractionDigits: 2, maximumFractionDigits: 2});
+  }
+
+  // one connection per page, the browser reconnects on its own
+  var source = new EventSource("/stream?symbols=" + encodeURIComponent(symbols.join(",")));
+  source.onmessage = function(event) {
+    var updates = JSON.parse(event.data);
+    $.each(updates, function(symbol, quote) {
+      $('[data-price="' + symbol + '"]').text(format(quote.price));
+      if (quote.change !== null) {
+        $('[data-change="' + symbol + '"]')
+          .text((quote.change >= 0 ? "+" : "") + format(quote.change))
+          .toggleClass("text-success", quote.change >= 0)
+          .toggleClass("text-danger", quote.change < 0);
+      }
+    });
+  };
+});
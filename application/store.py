@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # windows, appends are serialized within the process only
+    fcntl = None
+
+import numpy as np
+
+from application import metrics
+
+# yfinance interval per store frequency
+INTERVALS = {'D': '1d', 'M': '1mo'}
+
+
+class PriceStore:
+    """Local closes per symbol, daily ('D') and monthly ('M').
+
+    Every series is two append-only raw files under `path/<freq>/`:
+    `<SYMBOL>.dates` with int64 days since epoch and `<SYMBOL>.close` with
+    float64 closes. Reads memory-map the files, updates fetch only the
+    tail from the last stored bar on. The last bar is overwritten since it
+    may belong to a day or month that had not closed yet.
+
+    Symbols ending in `.INFL` are okama inflation series stored as a
+    cumulative index, so they rebase like prices.
+    """
+
+    def __init__(self, path, provider, max_age=12 * 3600):
+        self.path = path
+        self.provider = provider
+        self.max_age = max_age
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def _files(self, symbol, freq):
+        folder = os.path.join(self.path, freq)
+        return (os.path.join(folder, f'{symbol}.dates'),
+                os.path.join(folder, f'{symbol}.close'))
+
+    @contextmanager
+    def _lock(self, symbol, freq):
+        """Serialize writers of a series across threads and processes."""
+        with self._guard:
+            lock = self._locks.setdefault((symbol, freq), threading.Lock())
+        with lock:
+            if fcntl is None:
+                yield
+                return
+            path = os.path.join(self.path, freq, f'{symbol}.lock')
+            with open(path, 'a') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _align(dates_file, close_file):
+        # a writer that died between the two appends left one file longer;
+        # readers never map rows past the shorter one, so cut them off
+        try:
+            sizes = [os.path.getsize(dates_file), os.path.getsize(close_file)]
+        except OSError:
+            return
+        rows = min(sizes) // 8
+        for path, size in zip((dates_file, close_file), sizes):
+            if size != rows * 8:
+                os.truncate(path, rows * 8)
+
+    def read(self, symbol, freq='D'):
+        """Return (dates as datetime64[D], closes) arrays for symbol."""
+        dates_file, close_file = self._files(symbol, freq)
+        try:
+            size = os.path.getsize(close_file) // 8
+        except OSError:
+            size = 0
+        if size == 0:
+            return np.empty(0, 'datetime64[D]'), np.empty(0, 'float64')
+        # a writer may be appending, only map rows present in both files
+        size = min(size, os.path.getsize(dates_file) // 8)
+        dates = np.memmap(dates_file, dtype='int64', mode='r', shape=(size,))
+        closes = np.memmap(close_file, dtype='float64', mode='r', shape=(size,))
+        return dates.view('datetime64[D]'), closes
+
+    def append(self, symbol, freq, dates, closes):
+        """Append bars newer than the last stored one."""
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        closes = np.asarray(closes, dtype='float64')
+        dates_file, close_file = self._files(symbol, freq)
+        os.makedirs(os.path.dirname(dates_file), exist_ok=True)
+
+        with self._lock(symbol, freq):
+            # another process may have appended since the caller looked
+            self._align(dates_file, close_file)
+            stored, _ = self.read(symbol, freq)
+            if len(stored):
+                last = stored[-1]
+                same = dates == last
+                if same.any():
+                    # the last bar may have been incomplete, overwrite it in
+                    # place, files never shrink under a reader's memory map
+                    with open(close_file, 'r+b') as f:
+                        f.seek((len(stored) - 1) * 8)
+                        f.write(closes[same][-1:].tobytes())
+                mask = dates > last
+                dates, closes = dates[mask], closes[mask]
+            # dates first, readers only map rows present in both files
+            with open(dates_file, 'ab') as f:
+                f.write(dates.astype('int64').tobytes())
+            with open(close_file, 'ab') as f:
+                f.write(closes.tobytes())
+
+    def is_fresh(self, symbol, freq='D'):
+        try:
+            age = time.time() - os.path.getmtime(self._files(symbol, freq)[1])
+        except OSError:
+            return False
+        return age < self.max_age
+
+    def update(self, symbol, freq='D'):
+        """Download bars missing after the last stored one."""
+        stored, _ = self.read(symbol, freq)
+        start = str(stored[-1]) if len(stored) else None
+        if symbol.endswith('.INFL'):
+            dates, closes = self._inflation(symbol)
+        else:
+            df = self.provider.history(symbol, start=start, interval=INTERVALS[freq])
+            close = df['Close'].dropna()
+            index = close.index
+            if getattr(index, 'tz', None) is not None:
+                index = index.tz_localize(None)
+            dates, closes = index.values.astype('datetime64[D]'), close.values
+        if len(dates) == 0 and len(stored):
+            # nothing new, mark as checked
+            os.utime(self._files(symbol, freq)[1])
+            return
+        self.append(symbol, freq, dates, closes)
+
+    @staticmethod
+    def _inflation(symbol):
+        import okama as ok
+        with metrics.upstream('okama', 'Inflation'):
+            monthly = ok.Inflation(symbol).values_monthly
+        index = (1 + monthly).cumprod()
+        dates = index.index.to_timestamp().values.astype('datetime64[D]')
+        return dates, index.values
+
+    def frame(self, symbols, freq='D', start=None, refresh=True):
+        """Return closes aligned on common dates, one column per symbol.
+
+        Monthly frames are indexed by pandas Period, daily by date.
+        With refresh, series older than max_age are updated first.
+        """
+        import pandas as pd
+        columns = {}
+        for symbol in dict.fromkeys(symbols):
+            if refresh and not self.is_fresh(symbol, freq):
+                self.update(symbol, freq)
+            dates, closes = self.read(symbol, freq)
+            index = pd.DatetimeIndex(dates)
+            if freq == 'M':
+                index = index.to_period('M')
+            # copy out of the memory map so the frame outlives the file
+            columns[symbol] = pd.Series(np.array(closes), index=index)
+        df = pd.concat(columns, axis=1, join='inner')
+        if start is not None:
+            df = df.loc[start:]
+        return df
+
+    def returns(self, symbols, freq='D', start=None, refresh=True):
+        """Return matrix of simple returns aligned on common dates."""
+        df = self.frame(symbols, freq, refresh=refresh).pct_change().iloc[1:]
+        return df if start is None else df.loc[start:]
+
+    def matrix(self, symbols, days, freq='D', refresh=True):
+        """Return (closes, real) as (days x symbols) arrays.
+
+        closes holds the last close on or before each day, NaN before a
+        series starts. real is False where that close may be out of date:
+        past the last stored bar of a series that could not be refreshed.
+        """
+        days = np.asarray(days, dtype='datetime64[D]')
+        result = np.full((len(days), len(symbols)), np.nan)
+        real = np.zeros((len(days), len(symbols)), dtype=bool)
+        for j, symbol in enumerate(symbols):
+            if refresh and not self.is_fresh(symbol, freq):
+                try:
+                    self.update(symbol, freq)
+                except Exception:
+                    # serve what is stored, caller fills the gaps
+                    pass
+            dates, closes = self.read(symbol, freq)
+            if len(dates) == 0:
+                continue
+            idx = np.searchsorted(dates, days, side='right') - 1
+            known = idx >= 0
+            result[known, j] = closes[idx[known]]
+            real[:, j] = known & (self.is_fresh(symbol, freq) | (days <= dates[-1]))
+        return result, real
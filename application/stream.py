@@ -0,0 +1,120 @@
+import queue
+import threading
+import time
+
+
+class Subscriber:
+    """One connected client, updates arrive in a bounded queue.
+
+    A None in the queue means the client fell behind and was dropped.
+    """
+
+    def __init__(self, symbols, queue_size):
+        self.symbols = frozenset(symbols)
+        self.queue = queue.Queue(queue_size)
+
+
+class PriceStream:
+    """Poll quotes for the union of subscribed symbols, fan out changes.
+
+    `fetch(symbols)` returns {symbol: quote or None}; upstream load grows
+    with distinct symbols, not with the number of clients. The poller
+    thread starts with the first subscriber and never blocks on a client:
+    one whose queue is full is dropped and has to reconnect.
+    """
+
+    def __init__(self, fetch, interval=5, queue_size=16, max_clients=256):
+        self.fetch = fetch
+        self.interval = interval
+        self.queue_size = queue_size
+        self.max_clients = max_clients
+        self._subscribers = set()
+        self._last = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.polls = 0
+        self.dropped = 0
+
+    def subscribe(self, symbols):
+        """Return a Subscriber or None when max_clients are connected.
+
+        Its queue starts with the last known prices of its symbols.
+        """
+        subscriber = Subscriber(symbols, self.queue_size)
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                return None
+            self._subscribers.add(subscriber)
+            known = {symbol: self._last[symbol] for symbol in subscriber.symbols
+                     if symbol in self._last}
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='price-stream',
+                                                daemon=True)
+                self._thread.start()
+        if known:
+            subscriber.queue.put_nowait(known)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _drop(self, subscriber):
+        # must be called with the lock held
+        self._subscribers.discard(subscriber)
+        self.dropped += 1
+        while True:
+            try:
+                subscriber.queue.get_nowait()
+            except queue.Empty:
+                break
+        subscriber.queue.put_nowait(None)
+
+    def poll(self):
+        """Fetch the subscribed symbols once and queue what changed."""
+        with self._lock:
+            symbols = set().union(*(s.symbols for s in self._subscribers))
+        if not symbols:
+            return
+        self.polls += 1
+        changed = {}
+        for symbol, quote in self.fetch(symbols).items():
+            if not quote:
+                continue
+            update = {'price': quote['price'], 'change': quote.get('change'),
+                      'stale': bool(quote.get('stale'))}
+            if self._last.get(symbol) != update:
+                changed[symbol] = update
+        if not changed:
+            return
+
+        with self._lock:
+            self._last.update(changed)
+            for subscriber in list(self._subscribers):
+                update = {symbol: changed[symbol] for symbol in subscriber.symbols
+                          if symbol in changed}
+                if not update:
+                    continue
+                try:
+                    subscriber.queue.put_nowait(update)
+                except queue.Full:
+                    self._drop(subscriber)
+
+    def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                self.poll()
+            except Exception:
+                # keep streaming, the next poll may succeed
+                pass
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "clients": len(self._subscribers),
+                "symbols": len(set().union(*(s.symbols for s in self._subscribers))),
+                "polls": self.polls,
+                "dropped": self.dropped,
+            }
@@ -0,0 +1,72 @@
+import re
+from bisect import bisect_left
+
+# characters ignored when matching names
+_PUNCT = re.compile(r'[^0-9a-z ]+')
+
+
+def normalize(text):
+    return _PUNCT.sub('', text.lower()).strip()
+
+
+def normalize_ticker(text):
+    """Like normalize without spaces, "BRK-B", "brk.b" and "BRK B" are equal."""
+    return normalize(text).replace(' ', '')
+
+
+class TickerIndex:
+    """Prefix search over tickers and company names.
+
+    Keys are kept in sorted lists so a prefix lookup is two binary
+    searches plus a slice of the first `limit` hits. Results are ranked
+    by tier: exact ticker, ticker prefix, name prefix, prefix of any word
+    in the name. Inside a tier matches come in alphabetical order.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        tickers = []
+        names = []
+        words = []
+        for i, record in enumerate(records):
+            tickers.append((normalize_ticker(record['value']), i))
+            label = normalize(record['label'])
+            names.append((label, i))
+            # every word after the first, the first one is covered by names
+            for word in label.split()[1:]:
+                words.append((word, i))
+        tickers.sort()
+        names.sort()
+        words.sort()
+        self._tiers = []
+        for pairs in (tickers, names, words):
+            self._tiers.append(([key for key, _ in pairs], [i for _, i in pairs]))
+
+    @staticmethod
+    def _prefix(keys, ids, prefix, limit):
+        start = bisect_left(keys, prefix)
+        end = start
+        stop = min(len(keys), start + limit)
+        while end < stop and keys[end].startswith(prefix):
+            end += 1
+        return ids[start:end]
+
+    def search(self, query, limit=10):
+        """Return up to `limit` records matching query, best first."""
+        query = normalize(query)
+        if not query or limit < 1:
+            return []
+        queries = (query.replace(' ', ''), query, query)
+
+        # an exact key sorts before its extensions, so exact ticker
+        # matches lead the first tier on their own
+        seen = set()
+        found = []
+        for (keys, ids), prefix in zip(self._tiers, queries):
+            if len(found) >= limit:
+                break
+            for i in self._prefix(keys, ids, prefix, limit):
+                if i not in seen:
+                    seen.add(i)
+                    found.append(i)
+        return [self.records[i] for i in found[:limit]]
@@ -0,0 +1,201 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from application import metrics
+from application.ticker_index import TickerIndex
+
+
+# records: list of {"label": company, "value": ticker}
+# gz: gzip compressed json of records, served as is by /companies
+# tickers: ticker_key of every symbol in the namespace, any type, or
+# None for snapshots written before tickers were kept
+Snapshot = namedtuple('Snapshot', ['records', 'gz', 'etag', 'built', 'tickers'])
+
+
+def ticker_key(symbol):
+    """Key for ticker checks: upper case, "-" as ".", no ".US" suffix."""
+    symbol = symbol.strip().upper().replace('-', '.')
+    return symbol[:-3] if symbol.endswith('.US') else symbol
+
+
+class SymbolUniverse:
+    """Companies per okama namespace, kept in memory and snapshotted to disk."""
+
+    def __init__(self, path, namespaces=('US',), refresh_interval=86400):
+        self.path = path
+        self.namespaces = tuple(ns.upper() for ns in namespaces)
+        self.refresh_interval = refresh_interval
+        self._snapshots = {}
+        # namespace -> (etag, TickerIndex)
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _file(self, ns):
+        return os.path.join(self.path, f'companies_{ns}.json.gz')
+
+    def _tickers_file(self, ns):
+        return os.path.join(self.path, f'tickers_{ns}.txt.gz')
+
+    def _write(self, path, data):
+        # write to a temp file of our own and swap, so readers never see a
+        # partial file and workers building at once don't share one
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _read(self, ns):
+        """Return the snapshot stored on disk, None if there is none."""
+        try:
+            with open(self._file(ns), 'rb') as f:
+                gz = f.read()
+            built = os.path.getmtime(self._file(ns))
+        except OSError:
+            return None
+        try:
+            with open(self._tickers_file(ns), 'rb') as f:
+                tickers = frozenset(gzip.decompress(f.read()).decode().split())
+        except OSError:
+            tickers = None
+        return self._snapshot(gz, built, tickers)
+
+    def load(self):
+        """Read existing snapshots from disk."""
+        for ns in self.namespaces:
+            snapshot = self._read(ns)
+            if snapshot is not None:
+                self._snapshots[ns] = snapshot
+
+    def _newer_on_disk(self, ns):
+        """Load and return the disk snapshot if another worker wrote a
+        newer one than ours, else None."""
+        snapshot = self._snapshots.get(ns)
+        try:
+            mtime = os.path.getmtime(self._file(ns))
+        except OSError:
+            return None
+        if snapshot is not None and mtime <= snapshot.built:
+            return None
+        try:
+            snapshot = self._read(ns)
+        except (OSError, EOFError, ValueError):
+            # written by an older release or damaged, rebuild it
+            return None
+        if snapshot is not None:
+            self._snapshots[ns] = snapshot
+        return snapshot
+
+    @staticmethod
+    def _snapshot(gz, built, tickers=None):
+        records = json.loads(gzip.decompress(gz))
+        etag = hashlib.sha1(gz).hexdigest()
+        return Snapshot(records, gz, etag, built, tickers)
+
+    def build(self, ns):
+        """Query okama for the namespace and replace its snapshot."""
+        import okama as ok
+        with metrics.upstream('okama', 'symbols_in_namespace'):
+            query = ok.symbols_in_namespace(ns)
+        tickers = frozenset(ticker_key(ticker) for ticker in query['ticker'])
+        query = query[query['type'] == 'Common Stock']
+        query = query.rename(columns={"name": "label", "ticker": "value"})
+        records = query[['label', 'value']].sort_values('label').to_dict(orient='records')
+
+        payload = json.dumps(records, separators=(',', ':')).encode()
+        # fixed mtime keeps the bytes, and so the etag, stable between builds
+        gz = gzip.compress(payload, compresslevel=9, mtime=0)
+
+        os.makedirs(self.path, exist_ok=True)
+        self._write(self._tickers_file(ns),
+                    gzip.compress('\n'.join(sorted(tickers)).encode(), mtime=0))
+        self._write(self._file(ns), gz)
+
+        snapshot = Snapshot(records, gz, hashlib.sha1(gz).hexdigest(), time.time(),
+                            tickers)
+        self._snapshots[ns] = snapshot
+        return snapshot
+
+    def get(self, ns='US'):
+        """Return snapshot for namespace, building it on first use."""
+        snapshot = self._snapshots.get(ns)
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshots.get(ns) or self._newer_on_disk(ns)
+            if snapshot is None:
+                snapshot = self.build(ns)
+            return snapshot
+
+    def search(self, query, ns='US', limit=10):
+        """Return companies matching query from the namespace index."""
+        snapshot = self.get(ns)
+        cached = self._indexes.get(ns)
+        if cached is None or cached[0] != snapshot.etag:
+            cached = (snapshot.etag, TickerIndex(snapshot.records))
+            self._indexes[ns] = cached
+        return cached[1].search(query, limit)
+
+    def contains(self, symbol):
+        """Return whether symbol is a known ticker, checked in memory.
+
+        Only snapshots already loaded are used, so this never waits for
+        okama. None means there is nothing to check against.
+        """
+        key = ticker_key(symbol)
+        known = None
+        for ns in self.namespaces:
+            snapshot = self._snapshots.get(ns)
+            if snapshot is None or snapshot.tickers is None:
+                continue
+            if key in snapshot.tickers:
+                return True
+            known = False
+        return known
+
+    def _current(self, snapshot):
+        # snapshots from before tickers were kept are rebuilt
+        return (snapshot is not None and snapshot.tickers is not None
+                and time.time() - snapshot.built < self.refresh_interval)
+
+    def refresh(self):
+        """Rebuild snapshots that are missing or older than the interval.
+
+        A snapshot another worker wrote to disk meanwhile is loaded
+        instead of being rebuilt.
+        """
+        for ns in self.namespaces:
+            if self._current(self._snapshots.get(ns)):
+                continue
+            try:
+                with self._lock:
+                    if self._current(self._newer_on_disk(ns)):
+                        continue
+                    self.build(ns)
+            except Exception:
+                # keep serving the old snapshot, try again next round
+                continue
+
+    def start(self):
+        """Refresh snapshots in a daemon thread."""
+        if self._thread is not None:
+            return
+
+        def run():
+            while True:
+                self.refresh()
+                time.sleep(min(self.refresh_interval, 3600))
+
+        self._thread = threading.Thread(target=run, name='universe-refresh',
+                                        daemon=True)
+        self._thread.start()
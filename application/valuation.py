@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from application import db, market_prices
+from application.models import Holdings, Users, Valuations
+
+Position = namedtuple('Position', ['symbol', 'company', 'shares', 'mean_price',
+                                   'price', 'total', 'pnl', 'stale'])
+Portfolio = namedtuple('Portfolio', ['positions', 'cash', 'total', 'cost', 'stale'])
+
+
+def value_portfolio(holdings, cash, quotes):
+    """Value holdings with quotes {symbol: quote}, nothing is written.
+
+    A holding without a quote is valued at its last stored price, or at
+    cost, and listed in `stale`.
+    """
+    positions = []
+    stale = set()
+    total = 0
+    cost = 0
+    for row in holdings:
+        quote = quotes.get(row.symbol)
+        if not quote or quote.get("stale"):
+            stale.add(row.symbol)
+        price = quote["price"] if quote else (row.price or row.mean_price)
+        value = price * row.shares
+        total += value
+        cost += row.mean_price * row.shares
+        positions.append(Position(row.symbol, row.company, row.shares, row.mean_price,
+                                  price, value, value - row.mean_price * row.shares,
+                                  row.symbol in stale))
+    return Portfolio(positions, cash, total, cost, stale)
+
+
+def snapshot_valuations():
+    """Store one valuation row per user, priced from the shared price table."""
+    holdings = Holdings.query.all()
+    quotes = market_prices.get_many({row.symbol for row in holdings})
+    by_user = {}
+    for row in holdings:
+        by_user.setdefault(row.user_id, []).append(row)
+
+    now = datetime.utcnow()
+    for user_id, cash in db.session.query(Users.id, Users.cash):
+        portfolio = value_portfolio(by_user.get(user_id, []), cash, quotes)
+        db.session.add(Valuations(user_id=user_id, date=now, cash=cash,
+                                  holdings=portfolio.total, cost=portfolio.cost))
+    db.session.commit()
+
+
+class ValuationSnapshotter:
+    """Run snapshot_valuations every `interval` seconds in a daemon thread.
+
+    Every worker runs one; a worker that finds a snapshot taken by
+    another one less than half an interval ago skips its turn.
+    """
+
+    def __init__(self, app, interval=3600):
+        self.app = app
+        self.interval = interval
+        self._thread = None
+
+    def _tick(self):
+        latest = db.session.query(db.func.max(Valuations.date)).scalar()
+        if latest and (datetime.utcnow() - latest).total_seconds() < self.interval / 2:
+            # another worker took this round's snapshot
+            return
+        snapshot_valuations()
+
+    def start(self):
+        if self._thread is not None or self.interval <= 0:
+            return
+
+        def run():
+            while True:
+                time.sleep(self.interval)
+                with self.app.app_context():
+                    try:
+                        self._tick()
+                    except Exception:
+                        self.app.logger.exception('valuation snapshot failed')
+
+        self._thread = threading.Thread(target=run, name='valuation-snapshot',
+                                        daemon=True)
+        self._thread.start()
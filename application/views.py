@@ -1,37 +1,64 @@
 
-import concurrent.futures as cf
+import csv
+import gzip
+import io
 import json
 import pytz
-from datetime import datetime
-
-import okama as ok
-import plotly
-import plotly.express as px
-import plotly.graph_objects as go
-import yfinance as yf
-from dateutil.relativedelta import relativedelta
-from flask import (flash, jsonify, redirect, render_template, request, session,
+import queue
+from datetime import datetime, timedelta
+
+from flask import (abort, flash, jsonify, make_response, redirect,
+                   render_template, request, session, stream_with_context,
                    url_for)
 from flask_login import current_user, login_required, login_user, logout_user
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import selectinload
 
-from application import app, db, lookup
+from application import (app, charts, db, executor, fundamentals,
+                         market_prices, metrics, price_stream, quote_cache,
+                         universe, user_cache)
+from application.analytics import wealth_indexes
 from application.forms import (BuyAsset, CreateList,
                                LoginForm, PasswordChangeForm,
                                QuoteForm, RegisterForm, SearchForm, SellAsset)
 from application.models import Favourites, History, Holdings, Lists, Users
+from application.orders import Order, OrderError, execute_orders
+from application.performance import nav_history
+from application.valuation import value_portfolio
 
 
 @app.route("/companies", methods=["GET", "POST"])
 @login_required
 def companies():
-    """Construct json data for US companies"""
-    # query US companies
-    query = ok.symbols_in_namespace('US')
-    # change column names
-    query = query.rename(columns={"name": "label", "ticker": "value"})
-    filt = (query['type'] == 'Common Stock')
-    data = query[filt].sort_values('label')
-    return jsonify(data.iloc[:, [2, 1]].to_dict(orient='records'))
+    """Serve json data for companies in namespace, US by default"""
+    ns = request.args.get('ns', 'US').upper()
+    if ns not in universe.namespaces:
+        abort(404)
+    snapshot = universe.get(ns)
+
+    if 'gzip' in request.accept_encodings:
+        response = make_response(snapshot.gz)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = make_response(gzip.decompress(snapshot.gz))
+    response.mimetype = 'application/json'
+    response.vary.add('Accept-Encoding')
+    # let the browser keep the payload but revalidate it with the etag
+    response.cache_control.no_cache = True
+    response.set_etag(snapshot.etag)
+    return response.make_conditional(request)
+
+
+@app.get("/companies/search")
+@login_required
+def companies_search():
+    """Return best matching companies for the autocomplete"""
+    ns = request.args.get('ns', 'US').upper()
+    if ns not in universe.namespaces:
+        abort(404)
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    return jsonify(universe.search(query, ns, limit))
 
 
 @app.route("/")
@@ -56,6 +83,13 @@ def register():
     return render_template("register.html", form=form)
 
 
+def rotate_session():
+    """Give the session a new id, so an id known before login is useless"""
+    regenerate = getattr(session, 'regenerate', None)
+    if regenerate is not None:
+        regenerate()
+
+
 @app.route("/login", methods=["GET", "POST"])
 def login():
     form = LoginForm()
@@ -65,6 +99,7 @@ def login():
 
         # check if the user exist and password correct
         if user_exist and user_exist.correct_password(entered_password=form.password.data):
+            rotate_session()
             login_user(user_exist)
             flash(
                 f'Success! You are logged in as {user_exist.username}.', category='success')
@@ -83,6 +118,7 @@ def logout():
 
     # Forget any user_id
     logout_user()
+    rotate_session()
     flash('You have been logged out!', category='info')
 
     # Redirect user to homepage
@@ -97,22 +133,10 @@ def quote():
     if form.validate_on_submit():
         symbol = form.symbol.data
 
-        def get_info(symbol):
-            return yf.Ticker(symbol).info
-
-        def get_yearly(symbol):
-            return yf.Ticker(symbol).financials
-
-        def get_quarterly(symbol):
-            return yf.Ticker(symbol).quarterly_financials
-        # run concurrent queries
-        with cf.ThreadPoolExecutor() as executor:
-            info = executor.submit(get_info, symbol)
-            year = executor.submit(get_yearly, symbol)
-            quarter = executor.submit(get_quarterly, symbol)
-            # iex = executor.submit(lookup, symbol)
+        # served from the fundamentals cache, yahoo only on first visit
+        data = fundamentals.get(symbol)
 
-        quote = info.result()
+        quote = data['info']
         session['symbol'] = quote['symbol']
         session['longName'] = quote['longName']
         prev = quote['previousClose']
@@ -142,34 +166,22 @@ def quote():
         # https://plotly.com/python/bar-charts/#colored-and-styled-bar-chart
         def makeGraph(period, company, str_yearly):
             # select specific rows
-            income = period.loc['Net Income']
-            income.index = list(period.columns.strftime('%Y-%m-%d'))
-            total_rev = period.loc['Total Revenue']
-            total_rev.index = list(period.columns.strftime('%Y-%m-%d'))
-
-            fig = go.Figure()
-            fig.add_trace(go.Bar(x=income.index, y=income, name='Net Income',
-                                 marker_color='rgb(26, 118, 255)', marker_line_width=0.1))
-            fig.add_trace(go.Bar(x=income.index, y=total_rev, name='Total Revenue',
-                                 marker_color='rgb(55, 83, 109)', marker_line_width=0.1))
-            fig.update_layout(xaxis=dict(
-                tickmode='array', tickvals=income.index))
-            fig.update_layout(title=f'{company} {str_yearly} Financials', xaxis_tickfont_size=14,
-                              yaxis=dict(
-                                  title=quote['financialCurrency'], titlefont_size=16, tickfont_size=14),
-                              legend=dict(x=0, y=1.0,
-                                          bgcolor='rgba(255, 255, 255, 0)',
-                                          bordercolor='rgba(255, 255, 255, 0)'
-                                          ),
-                              barmode='group',
-                              bargap=0.15,
-                              bargroupgap=0.1
-                              )
-            graph = json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
-            return graph
+            dates = period.columns.strftime('%Y-%m-%d')
+            return charts.bar_chart(dates, [
+                ('Net Income', period.loc['Net Income'], 'rgb(26, 118, 255)'),
+                ('Total Revenue', period.loc['Total Revenue'], 'rgb(55, 83, 109)')],
+                title=f'{company} {str_yearly} Financials',
+                yaxis_title=quote['financialCurrency'])
+
         # make graphs with 2 periods
-        yearly = makeGraph(year.result(), quote['longName'], 'Yearly')
-        quarterly = makeGraph(quarter.result(), quote['longName'], 'Quarterly')
+        # charts are rebuilt only when the cached financials change
+        yearly = charts.cached(
+            (symbol, 'financials', fundamentals.stored(symbol, 'financials')),
+            lambda: makeGraph(data['financials'], quote['longName'], 'Yearly'))
+        quarterly = charts.cached(
+            (symbol, 'quarterly_financials',
+             fundamentals.stored(symbol, 'quarterly_financials')),
+            lambda: makeGraph(data['quarterly_financials'], quote['longName'], 'Quarterly'))
 
         return render_template('quoted.html', form=form, ids=ids, in_fav=in_fav,
                                quote=quote, delta=delta, lists=lists, change=change,
@@ -183,39 +195,14 @@ def buy():
     """Buy shares of stock"""
     form = BuyAsset()
     if form.validate_on_submit():
-        # calculate purchase summ
-        quote = lookup(form.symbol.data)
-        shares = form.shares.data
-        purchase_summ = quote["price"] * shares
-
-        # get datetime
-        date = datetime.now().strftime("%x, %X")
-        current_user.cash -= purchase_summ
-
-        # # update user history
-        update = History()
-        update.add_operation(current_user, "Purchase",
-                             quote["name"], quote["symbol"], shares, quote["price"], date)
-
-        # update user holdings
-        portfolio = Holdings.query.filter_by(
-            user_id=current_user.id, symbol=quote["symbol"]).first()
-
-        if portfolio == None:
-            # when first purchase of company
-            portfolio = Holdings()
-            portfolio.add_asset(current_user, shares,
-                                quote["name"], quote["symbol"], quote["price"])
-            flash(
-                f'Successfull purchase {shares} share(s) of {quote["name"]} for ${quote["price"]}.', category='success')
-        else:
-            # when company already in holdings
-            portfolio.mean_price = (
-                portfolio.mean_price * portfolio.shares + purchase_summ) / (portfolio.shares + shares)
-            portfolio.shares += shares
-            db.session.commit()
-            flash(
-                f'Successfull purchase {shares} share(s) of {quote["name"]} for ${quote["price"]}.', category='success')
+        try:
+            fill, = execute_orders(current_user.id, [
+                Order('buy', form.symbol.data, form.shares.data)])
+        except OrderError as e:
+            flash(str(e), category='danger')
+            return redirect(url_for('buy'))
+        flash(
+            f'Successfull purchase {fill.shares} share(s) of {fill.company} for ${fill.price}.', category='success')
         return redirect(url_for('buy'))
     return render_template("buy.html", form=form)
 
@@ -230,84 +217,240 @@ def sell():
 
     holdings = Holdings.query.filter_by(user_id=current_user.id).first()
 
-    input_shares = form.shares.data
-    company = Holdings.query.filter_by(
-        user_id=current_user.id, symbol=form.company.data).first()
-
     if form.validate_on_submit():
-
-        if input_shares == company.shares:
-            db.session.delete(company)
-        else:
-            company.shares -= input_shares
-        db.session.commit()
-
-        # query user and stock price
-        user = Users.query.get(current_user.id)
-        quote = lookup(company.symbol)
-
-        # update cash
-        user.cash += input_shares * quote["price"]
-
-        # update history table
-        date = datetime.now().strftime("%x, %X")
-        update = History()
-        update.add_operation(
-            current_user, "Sell", quote["name"], quote["symbol"], input_shares, quote["price"], date)
+        try:
+            fill, = execute_orders(current_user.id, [
+                Order('sell', form.company.data, form.shares.data)])
+        except OrderError as e:
+            flash(str(e), category='danger')
+            return redirect(url_for('sell'))
         flash(
-            f'Successfully sold {input_shares} share(s) of {company.company}', category='success')
+            f'Successfully sold {fill.shares} share(s) of {fill.company}', category='success')
         return redirect(url_for('sell'))
 
     return render_template("/sell.html", form=form, holdings=holdings)
 
 
+@app.post("/orders")
+@login_required
+def orders():
+    """Execute a basket of buy and sell orders in one transaction"""
+    data = request.get_json(silent=True) or {}
+    try:
+        basket = []
+        for item in data['orders']:
+            if not (isinstance(item['side'], str) and isinstance(item['symbol'], str)):
+                raise TypeError('side and symbol must be strings')
+            basket.append(Order(item['side'], item['symbol'], int(item['shares'])))
+    except (KeyError, TypeError, ValueError):
+        return jsonify(error='Expected {"orders": [{"side", "symbol", "shares"}]}'), 400
+    if not basket:
+        return jsonify(error='No orders'), 400
+    try:
+        fills = execute_orders(current_user.id, basket)
+    except OrderError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(fills=[fill._asdict() for fill in fills], cash=current_user.cash)
+
+
 @app.get("/index")
 @login_required
 def index():
     '''Show portfolio of stocks'''
     # get holdings info
-    holdings = Holdings.query.filter_by(user_id=current_user.id).first()
+    holdings = Holdings.query.filter_by(user_id=current_user.id).all()
 
     if not holdings:
         return render_template('index.html', holdings=holdings)
 
-    # convert sqlobject to dict, result in list of dictionaries
-    cash = current_user.cash
-    holdings = Holdings.query.filter_by(user_id=current_user.id).all()
+    # prices from the shared price table, kept fresh in the background
+    quotes = market_prices.get_many([row.symbol for row in holdings],
+                                    timeout=app.config['UPSTREAM_DEADLINE'])
+    # valued in memory, the page view does not write to the database
+    portfolio = value_portfolio(holdings, current_user.cash, quotes)
 
-    grand_total = 0
-    price_on_buy = 0
+    return render_template('index.html', holdings=portfolio.positions,
+                           total=portfolio.total, cash=portfolio.cash,
+                           delta=portfolio.cost - portfolio.total,
+                           stale=portfolio.stale)
 
-    symbols = [row.symbol for row in holdings]
-    # calculate future values with concurrent method
-    with cf.ThreadPoolExecutor() as executor:
-        quotes = executor.map(lookup, symbols)
-        for index, quote in enumerate(quotes):
-            holdings[index].price = quote["price"]
-            holdings[index].total = quote['price'] * holdings[index].shares
-            grand_total += quote["price"] * holdings[index].shares
-            price_on_buy += holdings[index].mean_price * holdings[index].shares
 
-    dif = price_on_buy - grand_total
-    db.session.commit()
-    return render_template('index.html', holdings=holdings, total=grand_total, cash=cash, delta=dif)
+@app.get("/performance")
+@login_required
+def performance():
+    """Show daily portfolio value rebuilt from the history of trades"""
+    days, navs = nav_history(current_user.id)
+    if not days:
+        return render_template('performance.html', graph=None)
+
+    import pandas as pd
+    df = pd.DataFrame({'Portfolio': navs}, index=pd.DatetimeIndex(days))
+    graph = charts.cached(
+        ('performance', current_user.id, hash(df.to_numpy().tobytes())),
+        lambda: charts.line_chart(df, title='Portfolio value', yaxis_title='USD',
+                                  legend_title=''))
+    return render_template('performance.html', graph=graph, nav=navs[-1])
+
+
+@app.get("/status")
+@login_required
+def status():
+    """Upstream executor, caches, price stream and price table counters"""
+    return jsonify(executor=executor.stats(), quote_cache=quote_cache.stats(),
+                   user_cache=user_cache.stats(), stream=price_stream.stats(),
+                   prices=market_prices.stats())
+
+
+@app.get("/metrics")
+def metrics_export():
+    """Request, SQL, upstream and thread pool metrics for Prometheus"""
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(401)
+    return app.response_class(metrics.render(),
+                              mimetype='text/plain; version=0.0.4')
+
+
+# seconds between keep-alive comments on an idle price stream
+STREAM_KEEPALIVE = 15
+
+
+@app.get("/stream")
+@login_required
+def stream():
+    """Push price updates for ?symbols=A,B as server-sent events"""
+    symbols = {symbol.strip().upper()
+               for symbol in request.args.get('symbols', '').split(',') if symbol.strip()}
+    if not symbols or len(symbols) > app.config['STREAM_MAX_SYMBOLS']:
+        abort(400)
+    subscriber = price_stream.subscribe(symbols)
+    if subscriber is None:
+        abort(503)
+
+    def events():
+        try:
+            while True:
+                try:
+                    update = subscriber.queue.get(timeout=STREAM_KEEPALIVE)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if update is None:
+                    # fell behind, the browser reconnects and starts fresh
+                    return
+                yield f'data: {json.dumps(update)}\n\n'
+        finally:
+            price_stream.unsubscribe(subscriber)
+
+    return app.response_class(
+        events(), mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# operations per history page
+HISTORY_PAGE_SIZE = 50
+
+
+def history_query(query, args):
+    """Apply symbol, type and date range filters from request args"""
+    symbol = args.get('symbol', '').strip().upper()
+    if symbol:
+        query = query.filter(History.symbol == symbol)
+    if args.get('type') in ('Purchase', 'Sell'):
+        query = query.filter(History.type == args['type'])
+    try:
+        if args.get('start'):
+            start = datetime.strptime(args['start'], '%Y-%m-%d')
+            query = query.filter(History.timestamp >= int(start.timestamp()))
+        if args.get('end'):
+            end = datetime.strptime(args['end'], '%Y-%m-%d') + timedelta(days=1)
+            query = query.filter(History.timestamp < int(end.timestamp()))
+    except ValueError:
+        abort(400)
+    # newest first, id breaks ties within the same second
+    return query.order_by(History.timestamp.desc(), History.id.desc())
 
 
 @app.get("/history")
 @login_required
 def history():
-    """Show history of transactions"""
-    operations = History.query.filter_by(user_id=current_user.id).all()
-    return render_template("history.html", operations=operations)
+    """Show history of transactions, one page at a time"""
+    query = history_query(History.query.filter_by(user_id=current_user.id),
+                          request.args)
+
+    # keyset pagination, cursor is "timestamp:id" of the last row shown;
+    # timestamp is NOT NULL since schema version 3, so no row is skipped
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            timestamp, id = map(int, cursor.split(':'))
+        except ValueError:
+            abort(400)
+        query = query.filter(or_(History.timestamp < timestamp,
+                                 and_(History.timestamp == timestamp, History.id < id)))
+
+    operations = query.limit(HISTORY_PAGE_SIZE + 1).all()
+    next_cursor = None
+    if len(operations) > HISTORY_PAGE_SIZE:
+        operations = operations[:HISTORY_PAGE_SIZE]
+        last = operations[-1]
+        next_cursor = f'{last.timestamp}:{last.id}'
+
+    filters = {key: value for key, value in request.args.items()
+               if key in ('symbol', 'type', 'start', 'end') and value}
+    return render_template("history.html", operations=operations, filters=filters,
+                           next_cursor=next_cursor, first_page=not cursor)
+
+
+@app.get("/history/export")
+@login_required
+def history_export():
+    """Stream filtered history as csv or json"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'json'):
+        abort(400)
+    columns = ('date', 'type', 'company', 'symbol', 'shares', 'price')
+    query = history_query(
+        db.session.query(*(getattr(History, c) for c in columns)).
+        filter(History.user_id == current_user.id), request.args)
+    # server side cursor, rows are fetched and sent in chunks
+    rows = query.yield_per(1000)
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() > 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def generate_json():
+        yield '['
+        separator = ''
+        for row in rows:
+            yield separator + json.dumps(dict(zip(columns, row)))
+            separator = ','
+        yield ']'
+
+    generate = generate_csv if fmt == 'csv' else generate_json
+    return app.response_class(
+        stream_with_context(generate()),
+        mimetype='text/csv' if fmt == 'csv' else 'application/json',
+        headers={'Content-Disposition': f'attachment; filename=history.{fmt}'})
 
 
 @app.route("/password_change", methods=["GET", "POST"])
 @login_required
 def password_change():
     """Change password and username"""
-    user = Users.query.filter_by(id=current_user.id).first()
     form = PasswordChangeForm()
     if form.validate_on_submit():
+        # current_user may come from the user cache, update the fresh row
+        user = Users.query.populate_existing().get(current_user.id)
         name = form.username.data
         password = form.password.data
         if name != user.username:
@@ -315,23 +458,28 @@ def password_change():
             if password:
                 user.password = password
                 db.session.commit()
+                user_cache.invalidate(user.id)
                 logout_user()
+                rotate_session()
                 flash(
                     'Successfully changed name and password. Please, log in', 'success')
                 return redirect(url_for('login'))
             else:
                 db.session.commit()
+                user_cache.invalidate(user.id)
                 flash(f'Changed name to "{name}"', 'success')
                 return redirect(url_for('password_change'))
         elif password:
             user.password = password
             db.session.commit()
+            user_cache.invalidate(user.id)
             logout_user()
+            rotate_session()
             flash('Successfully changed password. Please, log in', 'success')
             return redirect(url_for('login'))
         else:
             return redirect(url_for('password_change'))
-    return render_template('password_change.html', form=form, value=user.username)
+    return render_template('password_change.html', form=form, value=current_user.username)
 
 
 @app.route("/lists", methods=["GET", "POST"])
@@ -339,13 +487,19 @@ def password_change():
 def lists():
     """Manage lists with favourite assets"""
     form = CreateList()
-    lists = Lists.query.filter_by(user_id=current_user.id).all()
     if form.validate_on_submit():
         lists = Lists()
         lists.new_list(current_user, form.name.data)
         flash(f'Successfully created new list', category='success')
         return redirect(url_for('lists'))
-    return render_template("lists.html", lists=lists, form=form)
+
+    # all lists and their assets in two queries
+    lists = Lists.query.filter_by(user_id=current_user.id).\
+        options(selectinload(Lists.assets)).order_by(Lists.id).all()
+    # favourites of every list priced from the shared price table
+    quotes = market_prices.get_many({asset.symbol for list in lists for asset in list.assets},
+                                    timeout=app.config['UPSTREAM_DEADLINE'])
+    return render_template("lists.html", lists=lists, form=form, quotes=quotes)
 
 
 @app.post("/favourites")
@@ -355,35 +509,26 @@ def favourites():
     data = request.get_json()
     symbol = session['symbol']
     corp = session['longName']
-    set_my_ids = Favourites.query.filter_by(user_id=current_user.id,
-                                            symbol=symbol).all()
-    if not data['data']:
-        # asset have been deleted from favourites if any
-        if len(set_my_ids) > 0:
-            set_my_ids = {row.list_id for row in set_my_ids}
-            Favourites.query.filter(Favourites.list_id.in_(set_my_ids)).\
-                filter_by(symbol=symbol).delete()
-    else:
-        set_fav_ids = set(data['data'])
-        if len(set_my_ids) == 0:
-            # if no such a company in user lists, add all that in set_fav_ids
-            for id in set_fav_ids:
-                company = Favourites()
-                company.add_tolist(current_user, id, corp, symbol)
-        else:
-            # already have asset in 1 or more user lists
-            set_my_ids = {row.list_id for row in set_my_ids}
-            # find and delete assets in user lists that is not in fav lists
-            to_del = set_my_ids - set_fav_ids
-            if len(to_del) > 0:
-                Favourites.query.filter(Favourites.list_id.in_(to_del)).\
-                    filter_by(symbol=symbol).delete()
-            # add assets that is in fav lists and is not in user lists
-            to_add = set_fav_ids - set_my_ids
-            if len(to_add) > 0:
-                for id in to_add:
-                    company = Favourites()
-                    company.add_tolist(current_user, id, corp, symbol)
+    wanted = set(data['data'] or [])
+    if wanted:
+        # ignore ids of lists the user doesn't own
+        wanted = {id for id, in db.session.query(Lists.id).filter(
+            Lists.user_id == current_user.id, Lists.id.in_(wanted))}
+    saved = {id for id, in db.session.query(Favourites.list_id).filter_by(
+        user_id=current_user.id, symbol=symbol)}
+
+    # delete asset from lists that are unchecked, add to the new ones
+    to_del = saved - wanted
+    if to_del:
+        Favourites.query.filter(Favourites.user_id == current_user.id,
+                                Favourites.list_id.in_(to_del),
+                                Favourites.symbol == symbol).\
+            delete(synchronize_session=False)
+    to_add = wanted - saved
+    if to_add:
+        db.session.execute(Favourites.__table__.insert(), [
+            {'user_id': current_user.id, 'list_id': id, 'company': corp,
+             'symbol': symbol} for id in to_add])
     db.session.commit()
     return jsonify(data)
 
@@ -425,30 +570,23 @@ def search():
     """Search quote and compare companies performance
        with US inflation                        """
     form = SearchForm()
-    now = datetime.now()
-    last_year = (now + relativedelta(months=-13)).strftime("%Y-%m")
-    last_two = (now + relativedelta(months=-25)).strftime("%Y-%m")
-    last_five = (now + relativedelta(months=-61)).strftime("%Y-%m")
-
-    def makeGraph(period, form_data):
-        df = ok.AssetList(form_data, first_date=period).wealth_indexes
-        col_names = list(df.columns)
-        fig = px.line(df, x=df.index.astype(str), y=col_names,
-                      labels={"x": "", "value": "Wealth index",
-                              "variable": "Assets"},
-                      title='Wealth indexes compared to US inflation')
-        return json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
 
-    if form.validate_on_submit():
-        data = form.name.data.split(', ')[:-1]
-        assets = list(map(lambda x: (x + '.US'), data))
+    def makeGraph(df):
+        return charts.line_chart(df, title='Wealth indexes compared to US inflation',
+                                 yaxis_title='Wealth index', legend_title='Assets')
 
-        with cf.ThreadPoolExecutor() as executor:
-            graphOne = executor.submit(makeGraph, last_year, assets)
-            graphTwo = executor.submit(makeGraph, last_two, assets)
-            graphFive = executor.submit(makeGraph, last_five, assets)
-
-        return render_template('search.html', form=form, g_JSON_one=graphOne.result(),
-                               g_JSON_two=graphTwo.result(), g_JSON_five=graphFive.result())
+    if form.validate_on_submit():
+        assets = form.assets
+
+        # one download for 5 years, 1 and 2 years are sliced from it
+        indexes = wealth_indexes(assets, horizons=(13, 25, 61))
+        # cached by basket, horizon and a hash of the plotted values
+        graphOne, graphTwo, graphFive = (
+            charts.cached((tuple(assets), months, hash(df.to_numpy().tobytes())),
+                          lambda df=df: makeGraph(df))
+            for months, df in sorted(indexes.items()))
+
+        return render_template('search.html', form=form, g_JSON_one=graphOne,
+                               g_JSON_two=graphTwo, g_JSON_five=graphFive)
 
     return render_template('search.html', form=form)
@@ -0,0 +1,81 @@
+"""Compare plotly figure construction with the chart spec builder.
+
+Run from the repository root: python -m benchmarks.bench_charts
+"""
+import json
+import time
+
+import numpy as np
+import pandas as pd
+import plotly
+import plotly.express as px
+import plotly.graph_objects as go
+
+from application import charts
+
+
+def plotly_bar(period):
+    # what views.quote used to do
+    income = period.loc['Net Income']
+    total_rev = period.loc['Total Revenue']
+    x = list(period.columns.strftime('%Y-%m-%d'))
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=x, y=income, name='Net Income',
+                         marker_color='rgb(26, 118, 255)', marker_line_width=0.1))
+    fig.add_trace(go.Bar(x=x, y=total_rev, name='Total Revenue',
+                         marker_color='rgb(55, 83, 109)', marker_line_width=0.1))
+    fig.update_layout(xaxis=dict(tickmode='array', tickvals=x))
+    fig.update_layout(title='Company Yearly Financials', xaxis_tickfont_size=14,
+                      yaxis=dict(title='USD', title_font_size=16, tickfont_size=14),
+                      legend=dict(x=0, y=1.0, bgcolor='rgba(255, 255, 255, 0)',
+                                  bordercolor='rgba(255, 255, 255, 0)'),
+                      barmode='group', bargap=0.15, bargroupgap=0.1)
+    return json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
+
+
+def spec_bar(period):
+    return charts.bar_chart(period.columns.strftime('%Y-%m-%d'), [
+        ('Net Income', period.loc['Net Income'], 'rgb(26, 118, 255)'),
+        ('Total Revenue', period.loc['Total Revenue'], 'rgb(55, 83, 109)')],
+        title='Company Yearly Financials', yaxis_title='USD')
+
+
+def plotly_line(df):
+    # what views.search used to do
+    fig = px.line(df, x=df.index.astype(str), y=list(df.columns),
+                  labels={"x": "", "value": "Wealth index", "variable": "Assets"},
+                  title='Wealth indexes compared to US inflation')
+    return json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
+
+
+def spec_line(df):
+    return charts.line_chart(df, title='Wealth indexes compared to US inflation',
+                             yaxis_title='Wealth index', legend_title='Assets')
+
+
+def timeit(fn, arg, number=50):
+    start = time.perf_counter()
+    for _ in range(number):
+        fn(arg)
+    return (time.perf_counter() - start) / number * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    period = pd.DataFrame(rng.normal(1e9, 1e8, (2, 4)),
+                          index=['Net Income', 'Total Revenue'],
+                          columns=pd.date_range('2019-12-31', periods=4, freq='YE'))
+    months = pd.period_range('2019-01', periods=61, freq='M')
+    wealth = pd.DataFrame(1000 * np.cumprod(1 + rng.normal(0.01, 0.05, (61, 4)), axis=0),
+                          index=months, columns=['AAPL.US', 'MSFT.US', 'KO.US', 'USD.INFL'])
+
+    print(f'bar  plotly: {timeit(plotly_bar, period):.2f} ms  spec: {timeit(spec_bar, period):.3f} ms')
+    print(f'line plotly: {timeit(plotly_line, wealth):.2f} ms  spec: {timeit(spec_line, wealth):.3f} ms')
+    start = time.perf_counter()
+    for _ in range(1000):
+        charts.cached(('bench', 61, 0), lambda: spec_line(wealth))
+    print(f'line cached: {(time.perf_counter() - start) / 1000 * 1000:.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Hammer /buy and /index with many simulated users.
+
+Run from the repository root against a scratch database, e.g.
+
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.bench_concurrency
+    DATABASE_URL=postgresql://localhost/bench python -m benchmarks.bench_concurrency
+
+Quotes come from the fake provider, so only the database is measured.
+Set SQLITE_JOURNAL_MODE=DELETE to compare with default journaling.
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+
+os.environ.setdefault('QUOTE_PROVIDER', 'fake')
+os.environ.setdefault('CS50_SECRET_KEY', 'bench')
+os.environ.setdefault('VALUATION_SNAPSHOT_INTERVAL', '0')
+
+from application import create_app, db, quote_provider  # noqa: E402
+from application.models import History, Holdings, Users  # noqa: E402
+
+app = create_app()
+
+SYMBOLS = ['AAA', 'BBB', 'CCC', 'DDD', 'EEE']
+
+
+def setup(users):
+    for i, symbol in enumerate(SYMBOLS):
+        quote_provider.data[symbol] = {'name': f'{symbol} Inc', 'symbol': symbol,
+                                       'price': 10.0 + i, 'date': 0, 'change': 0.0}
+    app.config['WTF_CSRF_ENABLED'] = False
+    names = [f'bench{i}' for i in range(users)]
+    with app.app_context():
+        existing = {name for name, in db.session.query(Users.username).
+                    filter(Users.username.in_(names))}
+        for name in names:
+            if name not in existing:
+                db.session.add(Users(username=name, password='benchpass'))
+        db.session.commit()
+    return names
+
+
+def user_loop(name, requests, timings, errors):
+    client = app.test_client()
+    client.post('/login', data={'username': name, 'password': 'benchpass'})
+    for i in range(requests):
+        if i % 2:
+            path, kwargs = '/index', {}
+        else:
+            path, kwargs = '/buy', {'data': {'symbol': SYMBOLS[i % len(SYMBOLS)],
+                                             'shares': 1}}
+        start = time.perf_counter()
+        try:
+            response = (client.post(path, **kwargs) if kwargs
+                        else client.get(path))
+            ok = response.status_code < 400
+        except Exception as e:
+            ok = False
+            errors.append(f'{path}: {e}')
+        timings.setdefault(path, []).append(time.perf_counter() - start)
+        if not ok:
+            errors.append(f'{path}: status {response.status_code}')
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=50,
+                        help='requests per user, half /buy and half /index')
+    args = parser.parse_args()
+
+    names = setup(args.users)
+    timings = {}
+    errors = []
+    threads = [threading.Thread(target=user_loop,
+                                args=(name, args.requests, timings, errors))
+               for name in names]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(values) for values in timings.values())
+    print(f'{app.config["SQLALCHEMY_DATABASE_URI"]}: {args.users} users, '
+          f'{total} requests in {elapsed:.2f}s, {total / elapsed:.0f} req/s')
+    for path, values in sorted(timings.items()):
+        print(f'  {path:7} p50 {statistics.median(values) * 1000:7.1f} ms  '
+              f'p95 {percentile(values, 0.95) * 1000:7.1f} ms  '
+              f'p99 {percentile(values, 0.99) * 1000:7.1f} ms')
+    print(f'  errors: {len(errors)}')
+    for error in sorted(set(errors))[:5]:
+        print(f'    {error}')
+
+    with app.app_context():
+        users = Users.query.filter(Users.username.in_(names)).all()
+        ids = [user.id for user in users]
+        shares = db.session.query(db.func.sum(Holdings.shares)).\
+            filter(Holdings.user_id.in_(ids)).scalar() or 0
+        trades = History.query.filter(History.user_id.in_(ids)).count()
+    print(f'  consistency: {trades} trades, {shares} shares held')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Microbenchmark for /companies/search and ticker checks over the US universe.
+
+Run from the repository root: python -m benchmarks.bench_search
+"""
+import random
+import re
+import time
+
+from application import create_app, universe
+from application.ticker_index import TickerIndex
+
+
+def regex_scan(records, term, limit=10):
+    # what search.js used to do in the browser on every keystroke
+    matcher = re.compile('^' + re.escape(term), re.I)
+    return [r for r in records if matcher.match(r['label'] or r['value'])][:limit]
+
+
+def timeit(fn, queries, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for q in queries:
+            fn(q)
+        best = min(best, time.perf_counter() - start)
+    return best / len(queries)
+
+
+def main():
+    create_app()
+    records = universe.get('US').records
+    start = time.perf_counter()
+    index = TickerIndex(records)
+    build = time.perf_counter() - start
+
+    rng = random.Random(0)
+    queries = []
+    for record in rng.sample(records, 500):
+        source = rng.choice([record['value'], record['label']])
+        queries.append(source[:rng.randint(1, 4)])
+
+    indexed = timeit(lambda q: index.search(q, 10), queries)
+    scanned = timeit(lambda q: regex_scan(records, q), queries, repeat=1)
+    # form validation: half valid tickers, half typos
+    tickers = [record['value'] for record in rng.sample(records, 250)]
+    tickers += [ticker + 'QX' for ticker in tickers]
+    checked = timeit(universe.contains, tickers)
+
+    print(f'records:      {len(records)}')
+    print(f'index build:  {build * 1000:.1f} ms')
+    print(f'index search: {indexed * 1e6:.1f} us/query')
+    print(f'regex scan:   {scanned * 1e6:.1f} us/query')
+    print(f'ticker check: {checked * 1e6:.2f} us/symbol')
+
+
+if __name__ == '__main__':
+    main()
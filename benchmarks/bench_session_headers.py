@@ -0,0 +1,71 @@
+"""Measure session header bytes per request, signed cookie vs server session.
+
+Run from the repository root: python -m benchmarks.bench_session_headers
+
+A user logs in and quotes a symbol (the session then holds the quote,
+symbol and company name like after /quote), then requests a few pages.
+Prints the Cookie and Set-Cookie bytes per request for both backends.
+"""
+import os
+
+os.environ.setdefault('QUOTE_PROVIDER', 'fake')
+os.environ.setdefault('CS50_SECRET_KEY', 'bench')
+os.environ.setdefault('VALUATION_SNAPSHOT_INTERVAL', '0')
+
+from flask.sessions import SecureCookieSessionInterface  # noqa: E402
+
+from application import create_app, db, lookup, quote_provider  # noqa: E402
+from application.models import Users  # noqa: E402
+
+app = create_app()
+
+PAGES = ['/index', '/history', '/lists', '/static/styles.css']
+
+
+def setup():
+    quote_provider.data['AAPL'] = {
+        'name': 'Apple Inc.', 'symbol': 'AAPL', 'price': 187.44,
+        'date': 1700000000000, 'change': 1.27}
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        if Users.query.filter_by(username='benchsession').first() is None:
+            db.session.add(Users(username='benchsession', password='benchpass'))
+            db.session.commit()
+
+
+def measure(interface):
+    app.session_interface = interface
+    client = app.test_client()
+    client.post('/login', data={'username': 'benchsession', 'password': 'benchpass'})
+    with client.session_transaction() as session:
+        # what QuoteForm and views.quote leave in the session
+        session['quote'] = lookup('AAPL')
+        session['symbol'] = 'AAPL'
+        session['longName'] = 'Apple Inc.'
+
+    rows = []
+    for page in PAGES:
+        response = client.get(page)
+        cookie = response.request.headers.get('Cookie', '')
+        set_cookie = sum(len(value) for value in response.headers.getlist('Set-Cookie'))
+        rows.append((page, response.status_code, len(cookie), set_cookie))
+        response.close()
+    return rows
+
+
+def main():
+    setup()
+    server = app.session_interface
+    for name, interface in [('signed cookie', SecureCookieSessionInterface()),
+                            ('server session', server)]:
+        rows = measure(interface)
+        print(name)
+        for page, status, cookie, set_cookie in rows:
+            print(f'  {page:20} {status}  Cookie {cookie:5} B  Set-Cookie {set_cookie:5} B')
+        total = sum(cookie + set_cookie for _, _, cookie, set_cookie in rows)
+        print(f'  average {total / len(rows):.0f} B per request')
+    app.session_interface = server
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Measure cold start: import time of the package and time to first /login.
+
+Run from the repository root: python -m benchmarks.bench_startup
+
+Each measurement runs in a fresh interpreter. `python -X importtime`
+shows where import time goes and whether heavy data libraries are
+imported before a request needs them.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+HEAVY = ('pandas', 'yfinance', 'okama', 'plotly')
+
+FIRST_REQUEST = """
+import time
+start = time.perf_counter()
+import application
+imported = time.perf_counter()
+app = application.create_app(preload={preload})
+ready = time.perf_counter()
+response = app.test_client().get('/login')
+done = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(imported - start, ready - start, done - start)
+"""
+
+
+def environment(workdir):
+    env = dict(os.environ)
+    env.update({
+        'QUOTE_PROVIDER': 'fake',
+        'CS50_SECRET_KEY': 'bench',
+        'DATABASE_URL': f'sqlite:///{os.path.join(workdir, "startup.db")}',
+        'UNIVERSE_PATH': os.path.join(workdir, 'universe'),
+        'VALUATION_SNAPSHOT_INTERVAL': '0',
+        'PRICES_OPEN_INTERVAL': '0',
+    })
+    return env
+
+
+def importtime(env):
+    """Return ({module: cumulative us}, total us) for `import application`."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import application'],
+                            env=env, capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        modules[name.strip()] = int(cumulative)
+    return modules, modules.get('application', 0)
+
+
+def first_request(env, preload):
+    result = subprocess.run([sys.executable, '-c', FIRST_REQUEST.format(preload=preload)],
+                            env=env, capture_output=True, text=True, check=True)
+    return [float(value) for value in result.stdout.split()]
+
+
+def main():
+    env = environment(tempfile.mkdtemp(prefix='stockx-startup-'))
+    # first run creates the database, later ones measure a warm disk
+    first_request(env, False)
+
+    modules, total = importtime(env)
+    print(f'import application: {total / 1000:.0f} ms')
+    top = sorted(((cumulative, name) for name, cumulative in modules.items()
+                  if '.' not in name and name != 'application'), reverse=True)[:8]
+    for cumulative, name in top:
+        print(f'  {name:20} {cumulative / 1000:7.1f} ms')
+    loaded = [name for name in HEAVY if name in modules]
+    print(f'  heavy libraries imported: {", ".join(loaded) or "none"}')
+
+    for preload in (False, True):
+        imported, ready, done = first_request(env, preload)
+        print(f'preload={preload!s:5}  import {imported * 1000:6.0f} ms  '
+              f'create_app {ready * 1000:6.0f} ms  first /login {done * 1000:6.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Compare three okama AssetList downloads with one download plus slicing.
+
+Run from the repository root: python -m benchmarks.bench_wealth AAPL MSFT
+"""
+import sys
+import time
+from datetime import datetime
+
+import okama as ok
+from dateutil.relativedelta import relativedelta
+
+from application.analytics import wealth_cache, wealth_indexes
+
+HORIZONS = (13, 25, 61)
+
+
+def three_calls(assets):
+    # what views.search used to do
+    now = datetime.now()
+    return {months: ok.AssetList(assets, first_date=(
+        now + relativedelta(months=-months)).strftime("%Y-%m")).wealth_indexes
+        for months in HORIZONS}
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    assets = [f'{symbol}.US' for symbol in (sys.argv[1:] or ['AAPL', 'MSFT', 'KO'])]
+
+    old, old_time = timed(three_calls, assets)
+    wealth_cache.invalidate()
+    new, cold_time = timed(wealth_indexes, assets, HORIZONS)
+    _, warm_time = timed(wealth_indexes, assets, HORIZONS)
+
+    for months in HORIZONS:
+        diff = (old[months][new[months].columns] - new[months]).abs().max().max()
+        print(f'{months} months: max abs difference {diff:.6f}')
+    print(f'three calls:  {old_time:.2f} s')
+    print(f'one call:     {cold_time:.2f} s')
+    print(f'cached:       {warm_time * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Check that the hot per-user queries use an index instead of a scan.
+
+Runs EXPLAIN QUERY PLAN on SQLite for every query below and exits with
+status 1 if any of them scans a whole table.
+
+Run from the repository root: python -m benchmarks.explain_plans
+"""
+import sys
+
+from application import create_app, db
+from application.models import (Favourites, History, Holdings, Lists,
+                                NavSnapshots, Valuations)
+
+app = create_app()
+
+HOT_QUERIES = {
+    'holdings by user': lambda: Holdings.query.filter_by(user_id=1),
+    'holding by user and symbol': lambda: Holdings.query.filter_by(user_id=1, symbol='AAPL'),
+    'history page': lambda: History.query.filter_by(user_id=1).order_by(
+        History.timestamp.desc(), History.id.desc()),
+    'history by symbol': lambda: History.query.filter_by(user_id=1, symbol='AAPL'),
+    'lists by user': lambda: Lists.query.filter_by(user_id=1),
+    'favourites by list': lambda: Favourites.query.filter_by(user_id=1, list_id=1),
+    'favourites by symbol': lambda: Favourites.query.filter_by(user_id=1, symbol='AAPL'),
+    'list assets': lambda: Favourites.query.filter(Favourites.list_id.in_([1, 2])),
+    'valuations by user': lambda: Valuations.query.filter_by(user_id=1),
+    'nav snapshots': lambda: NavSnapshots.query.filter_by(user_id=1).order_by(NavSnapshots.day),
+}
+
+
+def plan(query):
+    sql = str(query.statement.compile(db.engine, compile_kwargs={"literal_binds": True}))
+    return [row[-1] for row in db.session.execute(db.text('EXPLAIN QUERY PLAN ' + sql))]
+
+
+def main():
+    failed = False
+    with app.app_context():
+        for name, query in HOT_QUERIES.items():
+            details = plan(query())
+            # "SCAN t" reads the whole table, "SCAN t USING INDEX" does not
+            scans = [d for d in details if d.startswith('SCAN') and 'INDEX' not in d]
+            failed |= bool(scans)
+            print(f"{'FAIL' if scans else 'ok  '} {name}: {'; '.join(details)}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
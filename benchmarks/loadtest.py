@@ -0,0 +1,367 @@
+"""End-to-end load and latency benchmark with in-process upstream stand-ins.
+
+Run from the repository root:
+
+    python -m benchmarks.loadtest --users 50 --holdings 20 --history 500 \\
+        --threads 8 --requests 50 --latency 0.02 --output results.json
+    python -m benchmarks.loadtest --compare before.json results.json
+
+IEX quotes come from FakeProvider, yfinance data from a FakeProvider
+with synthetic fundamentals and price history, and okama is replaced by
+a fake module, all with the given latency and failure rate. The app runs
+against a scratch database and data directory filled with N users x M
+holdings x K history rows. Every scenario reports p50/p95/p99 latency,
+throughput, errors, SQL queries and upstream calls per request.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+PASSWORD = 'benchpass'
+SCENARIOS = ['index', 'buy', 'sell', 'quote', 'search', 'companies', 'lists']
+
+
+def make_symbols(count):
+    return [f'T{i:03d}' for i in range(count)]
+
+
+class Upstream:
+    """Latency and failure injection shared by the fake okama module."""
+
+    def __init__(self, latency, failure_rate):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise ValueError('fake okama failure')
+
+
+def fake_okama(symbols, upstream):
+    """Module standing in for okama: namespaces, inflation, AssetList."""
+    okama = types.ModuleType('okama')
+
+    def symbols_in_namespace(ns):
+        upstream()
+        return pd.DataFrame({'ticker': [f'{symbol}.{ns}' for symbol in symbols],
+                             'name': [f'{symbol} Corporation' for symbol in symbols],
+                             'type': 'Common Stock'})
+
+    class Inflation:
+        def __init__(self, symbol):
+            upstream()
+            index = pd.period_range('2000-01', datetime.now().strftime('%Y-%m'), freq='M')
+            self.values_monthly = pd.Series(0.002, index=index)
+
+    class AssetList:
+        def __init__(self, assets, first_date=None):
+            upstream()
+            raise ValueError(f'fake okama has no history for {assets}')
+
+    okama.symbols_in_namespace = symbols_in_namespace
+    okama.Inflation = Inflation
+    okama.AssetList = AssetList
+    return okama
+
+
+def quote_data(symbols):
+    rng = random.Random(1)
+    return {symbol: {'name': f'{symbol} Corporation', 'symbol': symbol,
+                     'price': round(rng.uniform(5, 500), 2),
+                     'date': int(time.time()) * 1000,
+                     'change': round(rng.uniform(-5, 5), 2)}
+            for symbol in symbols}
+
+
+def yahoo_data(quotes):
+    """Fundamentals and daily/monthly closes per symbol for FakeProvider."""
+    days = pd.bdate_range(end=datetime.now().date(), periods=2520)
+    months = pd.date_range(end=datetime.now().date(), periods=240, freq='MS')
+    years = pd.to_datetime(['2019-12-31', '2020-12-31', '2021-12-31', '2022-12-31'])
+    quarters = pd.to_datetime(['2022-03-31', '2022-06-30', '2022-09-30', '2022-12-31'])
+    rng = np.random.default_rng(1)
+    data = {}
+    for symbol, quote in quotes.items():
+        walk = quote['price'] * np.exp(np.cumsum(rng.normal(0, 0.01, len(days))))
+        info = {
+            'symbol': symbol, 'longName': quote['name'], 'currentPrice': quote['price'],
+            'previousClose': quote['price'] - quote['change'],
+            'exchangeTimezoneName': 'America/New_York', 'financialCurrency': 'USD',
+            'country': 'United States', 'state': 'CA', 'city': 'Cupertino',
+            'sector': 'Technology', 'industry': 'Software', 'logo': '',
+            'longBusinessSummary': 'Synthetic company for benchmarks.',
+            'marketCap': 1e11, 'beta': 1.1, 'trailingPE': 25.0, 'trailingEps': 4.2,
+            'priceToBook': 8.0, 'enterpriseToEbitda': 18.0, 'debtToEquity': 90.0,
+            'dividendRate': 0.9, 'trailingAnnualDividendRate': 0.88,
+            'trailingAnnualDividendYield': 0.005, 'grossMargins': 0.4,
+            'ebitdaMargins': 0.3, 'operatingMargins': 0.28, 'profitMargins': 0.22,
+            'returnOnAssets': 0.15, 'returnOnEquity': 0.6, 'totalCash': 5e10,
+            'totalDebt': 1e11, 'totalRevenue': 3e11, 'freeCashflow': 9e10,
+            'operatingCashflow': 1e11, 'fiftyTwoWeekHigh': quote['price'] * 1.2,
+            'fiftyTwoWeekLow': quote['price'] * 0.8}
+        data[symbol] = {
+            'info': info,
+            'financials': pd.DataFrame(rng.uniform(1e9, 1e10, (2, 4)), columns=years,
+                                       index=['Net Income', 'Total Revenue']),
+            'quarterly_financials': pd.DataFrame(rng.uniform(1e8, 1e9, (2, 4)),
+                                                 columns=quarters,
+                                                 index=['Net Income', 'Total Revenue']),
+            'history': {'1d': pd.DataFrame({'Close': walk}, index=days),
+                        '1mo': pd.DataFrame({'Close': walk[-len(months):]}, index=months)},
+        }
+    return data
+
+
+def populate(app, db, symbols, quotes, users, holdings, history, seed=1):
+    """Insert users x holdings x history rows, two lists of favourites each."""
+    from application import bcrypt
+    from application.models import Favourites, History, Holdings, Lists, Users
+
+    rng = random.Random(seed)
+    password_hash = bcrypt.generate_password_hash(PASSWORD).decode('utf-8')
+    now = datetime.now()
+    with app.app_context():
+        db.session.execute(Users.__table__.insert(), [
+            {'username': f'bench{i}', 'password_hash': password_hash,
+             'cash': 10 ** 9} for i in range(users)])
+        ids = [id for id, in db.session.query(Users.id).order_by(Users.id)]
+        held = {}
+        rows, trades, lists = [], [], []
+        for user_id in ids:
+            held[user_id] = rng.sample(symbols, min(holdings, len(symbols)))
+            for symbol in held[user_id]:
+                quote = quotes[symbol]
+                rows.append({'user_id': user_id, 'symbol': symbol, 'company': quote['name'],
+                             'shares': 1000, 'mean_price': quote['price'],
+                             'price': quote['price'], 'total': quote['price'] * 1000})
+            for k in range(history):
+                symbol = rng.choice(held[user_id])
+                date = now - timedelta(minutes=history - k)
+                trades.append({'user_id': user_id, 'type': 'Purchase', 'symbol': symbol,
+                               'company': quotes[symbol]['name'], 'shares': 1,
+                               'price': quotes[symbol]['price'],
+                               'date': date.strftime("%x, %X"),
+                               'timestamp': int(date.timestamp())})
+            lists += [{'user_id': user_id, 'name': name} for name in ('Tech', 'Watch')]
+        db.session.execute(Holdings.__table__.insert(), rows)
+        for start in range(0, len(trades), 10000):
+            db.session.execute(History.__table__.insert(), trades[start:start + 10000])
+        db.session.execute(Lists.__table__.insert(), lists)
+        favourites = [{'user_id': row.user_id, 'list_id': row.id, 'symbol': symbol,
+                       'company': quotes[symbol]['name']}
+                      for row in Lists.query for symbol in rng.sample(symbols, 5)]
+        db.session.execute(Favourites.__table__.insert(), favourites)
+        db.session.commit()
+    return {f'bench{i}': held[user_id] for i, user_id in enumerate(ids)}
+
+
+def scenario_request(name, client, held, symbols, rng):
+    if name == 'index':
+        return client.get('/index')
+    if name == 'buy':
+        return client.post('/buy', data={'symbol': rng.choice(symbols), 'shares': 1})
+    if name == 'sell':
+        return client.post('/sell', data={'company': rng.choice(held), 'shares': 1})
+    if name == 'quote':
+        return client.post('/quote', data={'symbol': rng.choice(symbols)})
+    if name == 'search':
+        picked = rng.sample(symbols, 2)
+        return client.post('/search', data={'name': ', '.join(picked) + ', '})
+    if name == 'companies':
+        return client.get('/companies')
+    if name == 'lists':
+        return client.get('/lists')
+    raise ValueError(f'Unknown scenario {name}')
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else None
+
+
+def run_scenario(app, name, accounts, symbols, threads, requests, counter, upstream):
+    """Run name with `threads` logged in users, `requests` each."""
+    results = {'latency': [], 'queries': [], 'errors': 0}
+    lock = threading.Lock()
+    names = list(accounts)
+
+    def worker(n):
+        rng = random.Random(n)
+        username = names[n % len(names)]
+        client = app.test_client()
+        client.post('/login', data={'username': username, 'password': PASSWORD})
+        latency, queries, errors = [], [], 0
+        for _ in range(requests):
+            counter.reset()
+            start = time.perf_counter()
+            try:
+                response = scenario_request(name, client, accounts[username], symbols, rng)
+                if response.status_code >= 400:
+                    errors += 1
+                response.close()
+            except Exception:
+                errors += 1
+            latency.append(time.perf_counter() - start)
+            queries.append(counter.count)
+        with lock:
+            results['latency'] += latency
+            results['queries'] += queries
+            results['errors'] += errors
+
+    calls = upstream()
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latency, queries = results['latency'], results['queries']
+    return {
+        'requests': len(latency),
+        'errors': results['errors'],
+        'elapsed': elapsed,
+        'throughput': len(latency) / elapsed,
+        'p50_ms': percentile(latency, 50),
+        'p95_ms': percentile(latency, 95),
+        'p99_ms': percentile(latency, 99),
+        'mean_ms': float(np.mean(latency)) * 1000,
+        'queries_mean': float(np.mean(queries)),
+        'queries_max': int(max(queries)),
+        'upstream_calls_per_request': (upstream() - calls) / len(latency),
+    }
+
+
+class QueryCounter:
+    """Count SQL statements run by the current thread."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def __call__(self, *args):
+        self._local.count = self.count + 1
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+    def reset(self):
+        self._local.count = 0
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before, after):
+    old, new = (json.load(open(path)) for path in (before, after))
+    print(f'{old["meta"]["commit"]} -> {new["meta"]["commit"]}')
+    for name, result in new['scenarios'].items():
+        base = old['scenarios'].get(name)
+        if base is None:
+            continue
+        print(f'  {name:10} p95 {base["p95_ms"]:8.1f} -> {result["p95_ms"]:8.1f} ms  '
+              f'throughput {base["throughput"]:7.1f} -> {result["throughput"]:7.1f} req/s  '
+              f'queries {base["queries_mean"]:5.1f} -> {result["queries_mean"]:5.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--holdings', type=int, default=20, help='holdings per user')
+    parser.add_argument('--history', type=int, default=500, help='history rows per user')
+    parser.add_argument('--symbols', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=50, help='requests per thread')
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='seconds per upstream call')
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='compare two result files and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    workdir = tempfile.mkdtemp(prefix='stockx-bench-')
+    os.environ.update({
+        'QUOTE_PROVIDER': 'fake',
+        'CS50_SECRET_KEY': 'bench',
+        'DATABASE_URL': f'sqlite:///{os.path.join(workdir, "bench.db")}',
+        'UNIVERSE_PATH': os.path.join(workdir, 'universe'),
+        'PRICE_STORE_PATH': os.path.join(workdir, 'prices'),
+        'FUNDAMENTALS_PATH': os.path.join(workdir, 'fundamentals'),
+        'VALUATION_SNAPSHOT_INTERVAL': '0',
+    })
+    symbols = make_symbols(args.symbols)
+    okama_upstream = Upstream(args.latency, args.failure_rate)
+    sys.modules['okama'] = fake_okama(symbols, okama_upstream)
+
+    import application
+    from application.providers import FakeProvider
+    from sqlalchemy import event
+
+    app, db = application.create_app(), application.db
+    app.config['WTF_CSRF_ENABLED'] = False
+    quotes = quote_data(symbols)
+    iex = application.quote_provider
+    iex.data.update(quotes)
+    iex.latency, iex.failure_rate = args.latency, args.failure_rate
+    yahoo = FakeProvider(info=yahoo_data(quotes), latency=args.latency,
+                         failure_rate=args.failure_rate)
+    application.fundamentals.provider = yahoo
+    application.price_store.provider = yahoo
+
+    counter = QueryCounter()
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', counter)
+    accounts = populate(app, db, symbols, quotes, args.users, args.holdings, args.history)
+
+    def upstream():
+        return iex.calls + yahoo.calls + okama_upstream.calls
+
+    results = {}
+    for name in args.scenarios.split(','):
+        result = run_scenario(app, name, accounts, symbols, args.threads,
+                              args.requests, counter, upstream)
+        results[name] = result
+        print(f'{name:10} {result["requests"]:5} req  {result["throughput"]:7.1f} req/s  '
+              f'p50 {result["p50_ms"]:7.1f}  p95 {result["p95_ms"]:7.1f}  '
+              f'p99 {result["p99_ms"]:7.1f} ms  {result["queries_mean"]:5.1f} queries  '
+              f'{result["errors"]} errors')
+
+    report = {
+        'meta': {'commit': git_commit(), 'date': datetime.now().isoformat(timespec='seconds'),
+                 'python': platform.python_version(), 'params': vars(args)},
+        'scenarios': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()